@@ -0,0 +1,62 @@
+import functools
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+from rest_framework.permissions import SAFE_METHODS
+
+from api.profiling import current_profile
+
+
+def _run_read_view(view, request, *args, **kwargs):
+    """Выполняет представление в потоке из пула и рендерит ответ.
+
+    Цикл событий только отправляет готовые байты клиенту и не обращается
+    к базе данных. Потоковые ответы Django 3.2 перебирает прямо в цикле
+    событий, поэтому представления, которые читают базу по ходу
+    отдачи, обёртывать нельзя. Соединения потока закрываются по
+    CONN_MAX_AGE, как после обычного запроса.
+    """
+    try:
+        with current_profile.get() or nullcontext():
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Асинхронная обёртка над синхронным представлением DRF.
+
+    Django 3.2 выполняет синхронные представления под ASGI по одному в
+    общем потоке. Обёртка отправляет безопасные запросы (GET, HEAD,
+    OPTIONS) в пул потоков, где они выполняются параллельно, а
+    изменяющие оставляет в общем потоке.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await sync_to_async(
+                _run_read_view, thread_sensitive=False)(
+                view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wrapper
+
+
+def make_async_patterns(patterns, names):
+    """Заменяет представления маршрутов с указанными именами на async."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_read_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,97 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.models import User
+from recipes.versions import get_version
+
+
+class TokenCache:
+    """LRU-кеш токен → пользователь с ограниченным временем жизни.
+
+    Вместе с пользователем хранится его версия на момент загрузки.
+    Версия хранится в общем кеше и увеличивается при сохранении и
+    удалении пользователя и при удалении его токена, поэтому выход,
+    смена пароля, блокировка и удаление сразу видны во всех процессах.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        user, token, version, _ = entry
+        if get_version(User, user.pk) != version:
+            self.delete(key)
+            return None
+        return user, token
+
+    def set(self, key, user, token, version):
+        with self.lock:
+            self.entries[key] = (
+                user,
+                token,
+                version,
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL,
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def _get_user_key(key):
+    """Ключ общего кеша с id владельца токена; сам токен не хранится."""
+    return 'auth-token-user:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для недавно виденных токенов.
+
+    При AUTH_TOKEN_CACHE_SIZE = 0 работает как TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE_SIZE:
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token = cached
+            return copy.copy(user), token
+        # Версия читается до загрузки пользователя: если он изменится
+        # после чтения версии, запись устареет при следующей проверке.
+        # Владелец токена берётся из общего кеша, а не отдельным запросом;
+        # при первой встрече токена запись в кеш процесса откладывается.
+        user_key = _get_user_key(key)
+        user_id = cache.get(user_key)
+        version = None if user_id is None else get_version(User, user_id)
+        user, token = super().authenticate_credentials(key)
+        if user.pk == user_id:
+            token_cache.set(key, user, token, version)
+        else:
+            cache.set(user_key, user.pk, timeout=None)
+        return copy.copy(user), token
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import os
+
+from django.conf import settings
+from django.db.models import F
+
+from recipes.models import ShoppingListItem
+
+TITLE = '***СПИСОК ПОКУПОК***'
+NAME = 'ingredient__name'
+UNIT = 'ingredient__measurement_unit'
+
+
+def get_shopping_list(user):
+    """Сводный список ингредиентов, поддерживаемый при изменении корзины."""
+    return ShoppingListItem.objects.filter(user=user).values(
+        NAME, UNIT, amount=F('total_amount')).order_by(NAME, UNIT)
+
+
+class Echo:
+    """Псевдофайл, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_txt(rows):
+    yield f'{TITLE}\n\n'
+    for row in rows:
+        yield f'* {row[NAME]}: {row["amount"]} {row[UNIT]}\n'
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for row in rows:
+        yield writer.writerow((row[NAME], row['amount'], row[UNIT]))
+
+
+def export_json(rows):
+    separator = '['
+    for row in rows:
+        yield separator + json.dumps(
+            {
+                'name': row[NAME],
+                'amount': row['amount'],
+                'measurement_unit': row[UNIT],
+            },
+            ensure_ascii=False,
+        )
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def export_pdf(rows):
+    # PDF нельзя отдавать по частям: таблица ссылок пишется в конце файла.
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if font_path and os.path.exists(font_path):
+        font = 'ShoppingListFont'
+        if font not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(font, font_path))
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 18
+    y = height - margin
+    pdf.setFont(font, 16)
+    pdf.drawString(margin, y, TITLE)
+    y -= line_height * 2
+    pdf.setFont(font, 12)
+    for row in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - margin
+        pdf.drawString(
+            margin, y, f'* {row[NAME]}: {row["amount"]} {row[UNIT]}')
+        y -= line_height
+    pdf.save()
+    yield buffer.getvalue()
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+    'pdf': export_pdf,
+}
+
+
+def export_shopping_list(user, file_format):
+    return EXPORTERS[file_format](get_shopping_list(user).iterator())
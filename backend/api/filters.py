@@ -1,6 +1,24 @@
+from django.core.cache import cache
 from django_filters import rest_framework as filters
 
-from recipes import models
+from foodgram.db_routers import PRIMARY
+from recipes import models, search
+from recipes.versions import get_version
+
+
+def get_tag_ids_by_slug():
+    """Словарь {слаг: id} всех тегов, кешируется до изменения тегов."""
+    key = 'tag-ids-by-slug:{}'.format(get_version(models.Tag))
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(
+            models.Tag.objects.using(PRIMARY).values_list('slug', 'id'))
+        cache.set(key, tag_ids, timeout=None)
+    return tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
 
 
 class RecipeFilter(filters.FilterSet):
@@ -10,11 +28,11 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=models.Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='tags_filter',
     )
+    search = filters.CharFilter(method='search_filter')
 
     class Meta:
         model = models.Recipe
@@ -23,15 +41,27 @@ class RecipeFilter(filters.FilterSet):
             'is_in_shopping_cart',
             'author',
             'tags',
+            'search',
         )
 
     def is_favorited_filter(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorite_recipes__user=self.request.user)
+            return queryset.filter(id__in=models.Favorite.objects.filter(
+                user=self.request.user).values('recipe_id'))
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(
-                shopping_cart_recipes__user=self.request.user)
+            return queryset.filter(id__in=models.ShoppingCart.objects.filter(
+                user=self.request.user).values('recipe_id'))
         return queryset
+
+    def tags_filter(self, queryset, name, value):
+        # Тег могли удалить после проверки значений по choices.
+        tag_ids = get_tag_ids_by_slug()
+        return queryset.filter(id__in=models.RecipeTag.objects.filter(
+            tag_id__in=[tag_ids[slug] for slug in value if slug in tag_ids]
+        ).values('recipe_id'))
+
+    def search_filter(self, queryset, name, value):
+        return search.search(queryset, value)
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from api import metrics
+from foodgram.db_routers import is_replica_read
+from recipes.models import Ingredient, Recipe, Tag, User
+from recipes.versions import get_version, get_versions
+
+
+def _get_keys(recipes, variant):
+    recipe_versions = get_versions(Recipe, {recipe.id for recipe in recipes})
+    author_versions = get_versions(
+        User, {recipe.author_id for recipe in recipes})
+    common = '{}:{}:{}'.format(
+        get_version(Tag), get_version(Ingredient), variant)
+    return [
+        'recipe:{}:{}:{}:{}'.format(
+            recipe.id,
+            recipe_versions[recipe.id],
+            author_versions[recipe.author_id],
+            common,
+        )
+        for recipe in recipes
+    ]
+
+
+def get_fragments(recipes, build, variant=''):
+    """Закешированные представления рецептов, не зависящие от пользователя.
+
+    Ключ включает версии рецепта, автора, тегов и ингредиентов, поэтому
+    их изменение делает запись недоступной. build получает список
+    рецептов без записи в кеше и возвращает их представления.
+    Реплика может отставать от версий в ключе, поэтому представления,
+    построенные по её данным, хранятся под отдельными ключами
+    DATABASE_REPLICA_STICKY_SECONDS секунд и читаются только при чтении
+    с реплики. Чтение с основной базы их не видит, и пользователь,
+    закреплённый за ней после записи, получает свои изменения.
+    """
+    keys = _get_keys(recipes, variant)
+    if is_replica_read():
+        store_keys = [f'{key}:replica' for key in keys]
+        cached = cache.get_many(keys + store_keys)
+        for key, store_key in zip(keys, store_keys):
+            if key not in cached and store_key in cached:
+                cached[key] = cached[store_key]
+        timeout = settings.DATABASE_REPLICA_STICKY_SECONDS
+    else:
+        store_keys = keys
+        cached = cache.get_many(keys)
+        timeout = settings.RECIPE_FRAGMENT_TIMEOUT
+    missing = [
+        recipe for recipe, key in zip(recipes, keys) if key not in cached
+    ]
+    metrics.cache_requests.inc(
+        len(keys) - len(missing), cache='recipe_fragments', result='hit')
+    metrics.cache_requests.inc(
+        len(missing), cache='recipe_fragments', result='miss')
+    if missing:
+        built = dict(zip(
+            (recipe.id for recipe in missing), build(missing)))
+        new_fragments = {}
+        for recipe, key, store_key in zip(recipes, keys, store_keys):
+            if key not in cached:
+                new_fragments[store_key] = cached[key] = built[recipe.id]
+        cache.set_many(new_fragments, timeout)
+    return [cached[key] for key in keys]
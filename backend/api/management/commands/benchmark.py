@@ -0,0 +1,306 @@
+import json
+import math
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.middleware import QueryStats
+from api.serializers import IngredientSerializer
+from recipes.autocomplete import ingredient_index
+from recipes.models import (
+                            Ingredient,
+                            Recipe,
+                            ShoppingCart,
+                            Subscription,
+                            Tag,
+                            User,
+                            )
+
+# Число ингредиентов в рецептах, которые создаются и изменяются в тесте.
+RECIPE_SIZES = (5, 20, 100)
+# Страница списка рецептов для сравнения пагинации по номеру и курсору.
+DEEP_PAGE = 100
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест основных эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--output',
+            help='Файл для JSON-отчёта.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON-отчёт, с которым сравниваются результаты.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Допустимый относительный рост p95 по сравнению с базовым.',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Запустить только указанные эндпоинты.',
+        )
+
+    def _get_user(self):
+        """Пользователь с самой большой корзиной и числом подписок."""
+        user_id = ShoppingCart.objects.values('user').annotate(
+            total=Count('id')).order_by('-total').values_list(
+            'user', flat=True).first()
+        if user_id is None:
+            user_id = Subscription.objects.values('follower').annotate(
+                total=Count('id')).order_by('-total').values_list(
+                'follower', flat=True).first()
+        if user_id is None or not Recipe.objects.exists():
+            raise CommandError(
+                'Нет данных для теста, выполните seed_foodgram.')
+        return User.objects.get(id=user_id)
+
+    def _get_write_scenarios(self):
+        """Создание и изменение рецептов с разным числом ингредиентов."""
+        ingredient_ids = list(Ingredient.objects.values_list(
+            'id', flat=True)[:max(RECIPE_SIZES) * 2])
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+
+        def recipe_data(iteration, size, offset=0):
+            return {
+                'name': f'benchmark {time.time_ns()} {iteration}',
+                'text': 'Рецепт для нагрузочного теста.',
+                'cooking_time': 10,
+                'tags': tag_ids,
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': iteration + 2}
+                    for ingredient_id in ingredient_ids[
+                        offset:offset + size]
+                ],
+            }
+
+        def create(size):
+            def scenario(client, iteration):
+                response = client.post(
+                    '/api/recipes/', recipe_data(iteration, size),
+                    format='json')
+                self.created.append(response.json()['id'])
+                return response
+            return scenario
+
+        def update(size):
+            own_recipe = {}
+
+            def scenario(client, iteration):
+                if 'id' not in own_recipe:
+                    response = client.post(
+                        '/api/recipes/', recipe_data(-1, size),
+                        format='json')
+                    own_recipe['id'] = response.json()['id']
+                    self.created.append(own_recipe['id'])
+                # Половина ингредиентов заменяется, у остальных
+                # меняется количество.
+                return client.patch(
+                    f'/api/recipes/{own_recipe["id"]}/',
+                    recipe_data(
+                        iteration, size, offset=iteration % 2 * size // 2),
+                    format='json',
+                )
+            return scenario
+
+        scenarios = {}
+        for size in RECIPE_SIZES:
+            scenarios[f'recipe_create_{size}'] = create(size)
+            scenarios[f'recipe_update_{size}'] = update(size)
+        return scenarios
+
+    def _get_search_scenarios(self, search):
+        """Подсказки ингредиентов без HTTP: индекс и прежний icontains."""
+
+        def search_index(client, iteration):
+            ingredient_index.search(search, 20)
+
+        def search_orm(client, iteration):
+            IngredientSerializer(
+                Ingredient.objects.filter(name__icontains=search)[:20],
+                many=True,
+            ).data
+
+        return {
+            'ingredient_search_index': search_index,
+            'ingredient_search_orm': search_orm,
+        }
+
+    def _get_scenarios(self):
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        search = Ingredient.objects.values_list(
+            'name', flat=True).first()[:3]
+        tags_query = '&'.join(f'tags={slug}' for slug in slugs[:2])
+        all_tags_query = '&'.join(f'tags={slug}' for slug in slugs)
+
+        def get(path):
+            return lambda client, iteration: client.get(path)
+
+        cursor_page = {}
+
+        def get_cursor_page(client, iteration):
+            # Курсор страницы находится один раз, переходом по ссылкам.
+            if 'url' not in cursor_page:
+                url = '/api/recipes/?limit=6&cursor='
+                for _ in range(DEEP_PAGE - 1):
+                    url = client.get(url).json()['next']
+                cursor_page['url'] = url
+            return client.get(cursor_page['url'])
+
+        # Списки без limit не разбиваются на страницы, фронтенд всегда
+        # передаёт limit.
+        return {
+            'recipe_list': get('/api/recipes/?limit=6'),
+            'recipe_list_filtered': get(
+                f'/api/recipes/?limit=6&{tags_query}&is_favorited=1'),
+            'recipe_list_tags': get(f'/api/recipes/?limit=6&{all_tags_query}'),
+            'recipe_list_deep_page': get(
+                f'/api/recipes/?limit=6&page={DEEP_PAGE}'),
+            'recipe_list_deep_cursor': get_cursor_page,
+            'recipe_detail': get(f'/api/recipes/{recipe.id}/'),
+            'tag_list': get('/api/tags/'),
+            'feed': get('/api/recipes/feed/?limit=6'),
+            'subscriptions': get(
+                '/api/users/subscriptions/?limit=6&recipes_limit=3'),
+            'download_shopping_cart': get(
+                '/api/recipes/download_shopping_cart/?format=txt'),
+            'ingredient_search': get(f'/api/ingredients/?name={search}'),
+            **self._get_search_scenarios(search),
+            **self._get_write_scenarios(),
+        }
+
+    def _request(self, scenario, client, iteration):
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            start = time.perf_counter()
+            response = scenario(client, iteration)
+            if response is not None and response.streaming:
+                b''.join(response.streaming_content)
+            duration = time.perf_counter() - start
+        if response is not None and response.status_code >= 400:
+            raise CommandError(
+                f'{response.status_code}: {response.content[:200]}')
+        return duration, stats.count
+
+    def _measure(self, scenario, client, options):
+        for iteration in range(options['warmup']):
+            self._request(scenario, client, iteration)
+        durations, queries = [], []
+        for iteration in range(options['iterations']):
+            duration, count = self._request(scenario, client, iteration)
+            durations.append(duration * 1000)
+            queries.append(count)
+        tracemalloc.start()
+        self._request(scenario, client, options['iterations'])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'rps': round(len(durations) * 1000 / sum(durations), 1),
+            'p50_ms': round(percentile(durations, 50), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'queries': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def _compare(self, report, baseline, tolerance):
+        regressions = []
+        for name, result in report['endpoints'].items():
+            base = baseline['endpoints'].get(name)
+            if base is None:
+                continue
+            ratio = result['p95_ms'] / base['p95_ms']
+            self.stdout.write(
+                f'{name:24} p95 {base["p95_ms"]:>9.2f} -> '
+                f'{result["p95_ms"]:>9.2f} мс ({ratio - 1:+.0%}), '
+                f'запросов {base["queries"]} -> {result["queries"]}'
+            )
+            if ratio > 1 + tolerance:
+                regressions.append(f'{name}: p95 вырос на {ratio - 1:.0%}')
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {result["queries"]} '
+                    f'вместо {base["queries"]}')
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужна хотя бы одна итерация.')
+        user = self._get_user()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+            Token.objects.get_or_create(user=user)[0].key))
+        scenarios = self._get_scenarios()
+        if options['only']:
+            unknown = set(options['only']) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    'Неизвестные эндпоинты: {}.'.format(
+                        ', '.join(sorted(unknown))))
+            scenarios = {
+                name: scenarios[name] for name in options['only']}
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': options['iterations'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'endpoints': {},
+        }
+        self.created = []
+        try:
+            for name, scenario in scenarios.items():
+                result = self._measure(scenario, client, options)
+                report['endpoints'][name] = result
+                self.stdout.write(
+                    f'{name:24} {result["rps"]:>7.1f} rps, '
+                    f'p50 {result["p50_ms"]:>9.2f} '
+                    f'p95 {result["p95_ms"]:>9.2f} '
+                    f'p99 {result["p99_ms"]:>9.2f} мс, '
+                    f'запросов {result["queries"]:>3}, '
+                    f'память {result["peak_memory_kb"]:>8.1f} КБ'
+                )
+        finally:
+            Recipe.objects.filter(id__in=self.created).delete()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            regressions = self._compare(
+                report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    'Ухудшения относительно базового отчёта:\n'
+                    + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS(
+                'Ухудшений относительно базового отчёта нет.'))
@@ -0,0 +1,247 @@
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.benchmark import percentile
+
+SERVERS = {
+    'wsgi': ['foodgram.wsgi:application'],
+    'asgi': [
+        'foodgram.asgi:application',
+        '--worker-class', 'uvicorn.workers.UvicornWorker',
+    ],
+}
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get_children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы.
+        if int(stat.rsplit(')', 1)[1].split()[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def get_tree_rss(pid):
+    """Суммарная резидентная память процесса и его потомков в байтах."""
+    total = 0
+    for process in (pid, *get_children(pid)):
+        try:
+            with open(f'/proc/{process}/status') as file:
+                for line in file:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение gunicorn с синхронными воркерами (WSGI) и с воркерами '
+        'uvicorn (ASGI) при одинаковом числе воркеров и медленных клиентах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=64,
+            help='Число одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность теста каждого сервера в секундах.',
+        )
+        parser.add_argument('--path', default='/api/recipes/?limit=6')
+        parser.add_argument(
+            '--token',
+            help='Токен для заголовка Authorization.',
+        )
+        parser.add_argument(
+            '--send-delay',
+            type=float,
+            default=0.05,
+            help='Пауза клиента посреди отправки заголовков запроса.',
+        )
+        parser.add_argument(
+            '--read-delay',
+            type=float,
+            default=0.01,
+            help='Пауза клиента после чтения каждого фрагмента ответа.',
+        )
+        parser.add_argument('--read-size', type=int, default=4096)
+        parser.add_argument(
+            '--servers',
+            nargs='+',
+            choices=SERVERS,
+            default=list(SERVERS),
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для JSON-отчёта.',
+        )
+
+    def _start(self, server, port, workers):
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', *SERVERS[server],
+                '--workers', str(workers),
+                '--bind', f'127.0.0.1:{port}',
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Сервер {server} не запустился.')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'Сервер {server} не ответил за 30 секунд.')
+
+    async def _request(self, port, head, options):
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            # Медленный клиент: заголовки приходят в два приёма,
+            # ответ читается небольшими фрагментами с паузами.
+            half = len(head) // 2
+            writer.write(head[:half])
+            await writer.drain()
+            await asyncio.sleep(options['send_delay'])
+            writer.write(head[half:])
+            await writer.drain()
+            response = b''
+            while True:
+                chunk = await reader.read(options['read_size'])
+                if not chunk:
+                    break
+                response += chunk
+                await asyncio.sleep(options['read_delay'])
+        finally:
+            writer.close()
+        status = int(response.split(b' ', 2)[1]) if response else 0
+        return time.perf_counter() - start, status
+
+    async def _client(self, port, head, options, deadline, results):
+        while time.monotonic() < deadline:
+            try:
+                results.append(await asyncio.wait_for(
+                    self._request(port, head, options), 30))
+            except (OSError, IndexError, ValueError, asyncio.TimeoutError):
+                results.append((None, 0))
+
+    async def _sample_memory(self, pid, deadline, samples):
+        while time.monotonic() < deadline:
+            samples.append(get_tree_rss(pid))
+            await asyncio.sleep(0.2)
+
+    async def _load(self, port, pid, options):
+        lines = [
+            f'GET {options["path"]} HTTP/1.1',
+            'Host: localhost',
+            'Connection: close',
+        ]
+        if options['token']:
+            lines.append(f'Authorization: Token {options["token"]}')
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+        results, samples = [], []
+        deadline = time.monotonic() + options['duration']
+        await asyncio.gather(
+            self._sample_memory(pid, deadline, samples),
+            *(
+                self._client(port, head, options, deadline, results)
+                for _ in range(options['clients'])
+            ),
+        )
+        return results, samples
+
+    def _run(self, server, options):
+        port = get_free_port()
+        process = self._start(server, port, options['workers'])
+        try:
+            warmup = dict(options, duration=1, clients=options['workers'])
+            asyncio.run(self._load(port, process.pid, warmup))
+            results, samples = asyncio.run(
+                self._load(port, process.pid, options))
+        finally:
+            process.terminate()
+            process.wait()
+        durations = [
+            duration * 1000
+            for duration, status in results if status == 200
+        ]
+        if not durations:
+            raise CommandError(
+                f'Сервер {server} не ответил ни на один запрос.')
+        peak = max(samples) / 2 ** 20
+        rps = len(durations) / options['duration']
+        return {
+            'rps': round(rps, 1),
+            'p50_ms': round(percentile(durations, 50), 1),
+            'p95_ms': round(percentile(durations, 95), 1),
+            'p99_ms': round(percentile(durations, 99), 1),
+            'errors': len(results) - len(durations),
+            'peak_rss_mb': round(peak, 1),
+            'rps_per_100_mb': round(rps / peak * 100, 1),
+        }
+
+    def handle(self, *args, **options):
+        report = {
+            'path': options['path'],
+            'workers': options['workers'],
+            'clients': options['clients'],
+            'duration': options['duration'],
+            'send_delay': options['send_delay'],
+            'read_delay': options['read_delay'],
+            'servers': {},
+        }
+        if 'asgi' in options['servers'] and importlib.util.find_spec(
+            'uvicorn'
+        ) is None:
+            raise CommandError(
+                'Для сравнения с ASGI установите uvicorn==0.22.0.')
+        for server in options['servers']:
+            result = self._run(server, options)
+            report['servers'][server] = result
+            self.stdout.write(
+                f'{server:5} {result["rps"]:>7.1f} rps, '
+                f'p50 {result["p50_ms"]:>8.1f} '
+                f'p95 {result["p95_ms"]:>8.1f} '
+                f'p99 {result["p99_ms"]:>8.1f} мс, '
+                f'ошибок {result["errors"]:>4}, '
+                f'память {result["peak_rss_mb"]:>7.1f} МБ, '
+                f'{result["rps_per_100_mb"]:>6.1f} rps на 100 МБ'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,295 @@
+import atexit
+import contextlib
+import copy
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+_lock = threading.Lock()
+
+
+def escape_label(value):
+    """Экранирование значения метки по формату Prometheus."""
+    return (
+        value.replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def _key(self, labels):
+        return json.dumps(
+            [self.name, [str(labels[name]) for name in self.labelnames]])
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        with _lock:
+            registry.values[self._key(labels)] += amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            histogram = registry.histograms.get(key)
+            if histogram is None:
+                histogram = registry.histograms[key] = {
+                    'buckets': [0] * (len(self.buckets) + 1),
+                    'sum': 0,
+                }
+            histogram['buckets'][bisect_left(self.buckets, value)] += 1
+            histogram['sum'] += value
+
+
+def _merge(values, histograms, data):
+    """Добавляет метрики из data к values и histograms."""
+    for key, value in data['values'].items():
+        values[key] += value
+    for key, histogram in data['histograms'].items():
+        total = histograms.setdefault(key, {
+            'buckets': [0] * len(histogram['buckets']),
+            'sum': 0,
+        })
+        for number, count in enumerate(histogram['buckets']):
+            total['buckets'][number] += count
+        total['sum'] += histogram['sum']
+
+
+class Registry:
+    """Метрики процесса, периодически сбрасываемые в METRICS_DIR.
+
+    Каждый процесс пишет собственный файл, /api/metrics суммирует
+    файлы процессов. Метрики завершившихся процессов при сборе
+    переносятся в общий архив, а их файлы удаляются, поэтому после
+    перезапуска воркера gunicorn суммы не уменьшаются.
+    """
+    archive_name = 'archive.json'
+
+    def __init__(self):
+        self.metrics = {}
+        self.values = defaultdict(float)
+        self.histograms = {}
+        self.path = None
+        self.flushed = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        with _lock:
+            data = json.dumps({
+                'values': self.values,
+                'histograms': self.histograms,
+            })
+        self.flushed = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        if self.path is None:
+            self.path = os.path.join(
+                settings.METRICS_DIR, f'{os.getpid()}-{time.time_ns()}.json')
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(data)
+        os.replace(temporary, self.path)
+
+    def is_stale(self, path):
+        """Файл завершившегося процесса.
+
+        Пока pid занят процессом того же пользователя, файл учитывается
+        как есть, даже если pid достался новому процессу: сумма от этого
+        не меняется. Если pid занят чужим процессом, файл устаревает,
+        когда давно не обновлялся.
+        """
+        if path == self.path:
+            return False
+        try:
+            pid = int(os.path.basename(path).split('-')[0])
+            os.kill(pid, 0)
+        except (ValueError, ProcessLookupError):
+            return True
+        except PermissionError:
+            try:
+                age = time.time() - os.path.getmtime(path)
+            except OSError:
+                return False
+            return age > settings.METRICS_MAX_AGE
+        return False
+
+    def _read(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, data):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    @contextlib.contextmanager
+    def _archive_lock(self):
+        path = os.path.join(settings.METRICS_DIR, 'archive.lock')
+        with open(path, 'w') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _update_archive(self, paths):
+        """Переносит в архив метрики завершившихся процессов.
+
+        Возвращает архив и файлы работающих процессов. Архив хранит
+        имена перенесённых файлов, пока они не удалены: если сбор
+        прервётся раньше, метрики не будут учтены дважды.
+        """
+        archive_path = os.path.join(settings.METRICS_DIR, self.archive_name)
+        archive = self._read(archive_path) or {
+            'values': {}, 'histograms': {}, 'files': []}
+        names = {os.path.basename(path) for path in paths}
+        archived = set(archive['files']) & names
+        changed = archived != set(archive['files'])
+        values = defaultdict(float, archive['values'])
+        live = []
+        for path in paths:
+            name = os.path.basename(path)
+            if name in archived:
+                continue
+            if not self.is_stale(path):
+                live.append(path)
+                continue
+            data = self._read(path)
+            if data is not None:
+                _merge(values, archive['histograms'], data)
+            archived.add(name)
+            changed = True
+        archive['values'] = values
+        if changed:
+            archive['files'] = sorted(archived)
+            self._write(archive_path, archive)
+        for path in paths:
+            if os.path.basename(path) in archived:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+        return archive, live
+
+    def collect(self):
+        """Сумма метрик работающих процессов и архива."""
+        self.flush(force=True)
+        paths = [
+            path
+            for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json'))
+            if os.path.basename(path) != self.archive_name
+        ]
+        with self._archive_lock():
+            archive, live = self._update_archive(paths)
+        values = defaultdict(float, archive['values'])
+        histograms = copy.deepcopy(archive['histograms'])
+        for path in live:
+            data = self._read(path)
+            if data is not None:
+                _merge(values, histograms, data)
+        return values, histograms
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        values, histograms = self.collect()
+        samples = defaultdict(list)
+        for key, value in values.items():
+            name, labels = json.loads(key)
+            samples[name].append((labels, value))
+        for key, histogram in histograms.items():
+            name, labels = json.loads(key)
+            samples[name].append((labels, histogram))
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            family = f'{name}_total' if metric.type == 'counter' else name
+            lines.append(f'# HELP {family} {metric.documentation}')
+            lines.append(f'# TYPE {family} {metric.type}')
+            for labels, value in sorted(samples[name], key=lambda s: s[0]):
+                lines.extend(self._render_sample(metric, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def _render_sample(self, metric, labels, value):
+        pairs = [
+            '{}="{}"'.format(name, escape_label(label))
+            for name, label in zip(metric.labelnames, labels)
+        ]
+        if metric.type == 'counter':
+            yield '{}_total{{{}}} {}'.format(
+                metric.name, ','.join(pairs), value)
+            return
+        cumulative = 0
+        bounds = [*map(str, metric.buckets), '+Inf']
+        for bound, count in zip(bounds, value['buckets']):
+            cumulative += count
+            yield '{}_bucket{{{}}} {}'.format(
+                metric.name, ','.join([*pairs, f'le="{bound}"']), cumulative)
+        yield '{}_sum{{{}}} {}'.format(
+            metric.name, ','.join(pairs), value['sum'])
+        yield '{}_count{{{}}} {}'.format(
+            metric.name, ','.join(pairs), cumulative)
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True) if registry.path else None)
+
+VIEW_LABELS = ('view', 'action')
+
+requests = Counter(
+    'foodgram_http_requests',
+    'Обработанные запросы.',
+    (*VIEW_LABELS, 'method', 'status'),
+)
+request_duration = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса.',
+    VIEW_LABELS,
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+response_size = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер тела ответа, потоковые ответы не учитываются.',
+    VIEW_LABELS,
+    (256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+db_queries = Histogram(
+    'foodgram_db_queries',
+    'Число запросов к базе данных на один запрос.',
+    VIEW_LABELS,
+    (1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+cache_requests = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кешам приложения.',
+    ('cache', 'result'),
+)
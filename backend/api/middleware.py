@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.exceptions import AuthenticationFailed
+
+from api import metrics
+from api.authentication import CachedTokenAuthentication
+from api.profiling import Profile, current_profile
+
+logger = logging.getLogger('api.queries')
+
+# Под ASGI представление выполняется не в том потоке, что middleware,
+# и работает с другими соединениями, поэтому статистика запроса
+# передаётся через контекст, а не через обёртку конкретного соединения.
+current_query_stats = ContextVar('current_query_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """Запросы к базе данных, выполненные при обработке запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_view_name(view_func):
+    """Имя представления и действия вьюсета, например RecipeViewSet.list."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return view_func.__module__ + '.' + view_func.__name__, None
+    return view_class.__name__, view_class
+
+
+class HybridMiddleware:
+    """Middleware, работающее и под WSGI, и под ASGI.
+
+    Наследники переопределяют before, after и cleanup. Под ASGI они
+    выполняются в цикле событий и не должны обращаться к базе данных.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознаёт экземпляр как асинхронный обработчик.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.before(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.cleanup(state)
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.before(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.cleanup(state)
+        return self.after(request, response, state)
+
+    def before(self, request):
+        return None
+
+    def after(self, request, response, state):
+        return response
+
+    def cleanup(self, state):
+        pass
+
+
+class QueryInstrumentationMiddleware(HybridMiddleware):
+    """Считает запросы к базе данных и их время для каждого запроса.
+
+    При QUERY_TIMING_HEADERS результат добавляется в заголовки
+    Server-Timing и X-DB-Queries. Для действий вьюсета, указанных в его
+    атрибуте query_budgets, превышение бюджета пишется в журнал, а при
+    QUERY_BUDGET_STRICT вызывает QueryBudgetExceeded. Запросы, которые
+    выполняются при отдаче потокового ответа, не учитываются.
+    """
+
+    def before(self, request):
+        # Соединения, открытые до регистрации install_query_recorder.
+        for connection in connections.all():
+            install_query_recorder(None, connection)
+        request.query_stats = QueryStats()
+        return current_query_stats.set(request.query_stats)
+
+    def cleanup(self, token):
+        current_query_stats.reset(token)
+
+    def after(self, request, response, token):
+        stats = request.query_stats
+        view = getattr(request, 'query_view', None)
+        if view is not None:
+            self.check_budget(request, view, stats)
+        if settings.QUERY_TIMING_HEADERS:
+            response['Server-Timing'] = (
+                f'db;dur={stats.duration * 1000:.1f};'
+                f'desc="{stats.count} queries"'
+            )
+            response['X-DB-Queries'] = str(stats.count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name, view_class = get_view_name(view_func)
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower())
+        request.query_view = (name, view_class, action)
+
+    def check_budget(self, request, view, stats):
+        name, view_class, action = view
+        view_name = f'{name}.{action}' if action else name
+        logger.debug(
+            '%s %s: %d queries, %.1f ms, slowest %.1f ms: %s',
+            request.method, view_name, stats.count, stats.duration * 1000,
+            stats.slowest_duration * 1000, stats.slowest_sql,
+        )
+        budget = getattr(view_class, 'query_budgets', {}).get(action)
+        if budget is None or stats.count <= budget:
+            return
+        message = (
+            f'{request.method} {request.path} ({view_name}): '
+            f'{stats.count} запросов при бюджете {budget}, самый долгий '
+            f'{stats.slowest_duration * 1000:.1f} мс: {stats.slowest_sql}'
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ProfilerMiddleware(HybridMiddleware):
+    """Профилирование отдельного запроса по требованию сотрудника.
+
+    Включается параметром ?profile= или заголовком X-Profile со
+    значением cprofile (по умолчанию, в том числе при пустом значении)
+    или sample. Профиль сохраняется в PROFILER_DIR, его имя
+    возвращается в заголовке X-Profile-Id. Должен стоять после
+    AuthenticationMiddleware: сотрудник определяется по сессии или,
+    если её нет, по токену. Обычные запросы проходят без профилировщика
+    и без проверки пользователя. Под ASGI профилируется только поток
+    асинхронного представления из api.async_views, для остальных
+    представлений профиль не создаётся.
+    """
+    modes = ('cprofile', 'sample')
+
+    def get_mode(self, request):
+        mode = request.GET.get(settings.PROFILER_QUERY_PARAM)
+        if mode is None:
+            mode = request.headers.get(settings.PROFILER_HEADER)
+        if mode is None:
+            return None
+        return mode if mode in self.modes else self.modes[0]
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = self.get_mode(request)
+        if mode is None or not self.is_allowed(request):
+            return self.get_response(request)
+        with Profile(mode) as profile:
+            response = self.get_response(request)
+        response['X-Profile-Id'] = profile.save(request)
+        return response
+
+    async def __acall__(self, request):
+        mode = self.get_mode(request)
+        if mode is None or not await sync_to_async(self.is_allowed)(
+            request
+        ):
+            return await self.get_response(request)
+        profile = Profile(mode)
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        if profile.profiler is not None:
+            response['X-Profile-Id'] = await sync_to_async(profile.save)(
+                request)
+        return response
+
+    def is_allowed(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                credentials = CachedTokenAuthentication().authenticate(
+                    request)
+            except AuthenticationFailed:
+                return False
+            user = credentials[0] if credentials else None
+        return user is not None and user.is_staff
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Число, время, размер ответов и запросов к базе по действиям API.
+
+    Должен стоять перед QueryInstrumentationMiddleware, от которого
+    получает представление, действие и число запросов к базе данных.
+    """
+
+    def before(self, request):
+        return time.perf_counter()
+
+    def after(self, request, response, start):
+        duration = time.perf_counter() - start
+        name, _, action = getattr(
+            request, 'query_view', ('unresolved', None, None))
+        labels = {'view': name, 'action': action or ''}
+        metrics.requests.inc(
+            method=request.method, status=response.status_code, **labels)
+        metrics.request_duration.observe(duration, **labels)
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), **labels)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            metrics.db_queries.observe(stats.count, **labels)
+        metrics.registry.flush()
+        return response
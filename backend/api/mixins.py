@@ -0,0 +1,89 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from api import metrics
+from foodgram import db_routers
+from recipes.versions import get_version
+
+
+class ReplicaReadMixin:
+    """Действия из replica_actions читают данные с реплики.
+
+    Пользователь, недавно выполнивший запись через вьюсет, читает с
+    основной базы DATABASE_REPLICA_STICKY_SECONDS секунд. Аутентификация
+    и проверка прав всегда идут в основную базу.
+    """
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS
+            and self.action in self.replica_actions
+            and request.method in SAFE_METHODS
+            and not (
+                request.user.is_authenticated
+                and db_routers.is_sticky(request.user.pk)
+            )
+        ):
+            self._replica_token = db_routers.start_replica_read()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            db_routers.stop_replica_read(token)
+            self._replica_token = None
+        if (
+            request.method not in SAFE_METHODS
+            and request.user.is_authenticated
+            and response.status_code < 400
+        ):
+            db_routers.stick_to_primary(request.user.pk)
+        return super().finalize_response(
+            request, response, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """ETag для list и retrieve по версии данных модели.
+
+    Если клиент прислал актуальный If-None-Match, возвращается 304
+    без обращения к таблице и сериализации. Ответ, прочитанный с
+    реплики, ETag не получает: реплика может отставать от версии.
+    """
+
+    def get_etag(self, request):
+        source = '{}:{}:{}'.format(
+            get_version(self.queryset.model),
+            request.accepted_media_type,
+            request.get_full_path(),
+        )
+        return quote_etag(hashlib.sha1(source.encode()).hexdigest())
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and etag in parse_etags(if_none_match):
+            metrics.cache_requests.inc(cache='etag', result='hit')
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            metrics.cache_requests.inc(cache='etag', result='miss')
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_304_NOT_MODIFIED or (
+            response.status_code == status.HTTP_200_OK
+            and not db_routers.is_replica_read()
+        ):
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs)
@@ -1,6 +1,132 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+                                       BasePagination,
+                                       CursorPagination,
+                                       PageNumberPagination,
+                                       )
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes import feed
 
 
 class CustomPageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 6
+
+
+class CustomCursorPaginator(CursorPagination):
+    """Пагинация по курсору в формате ответа постраничной пагинации.
+
+    Не считает общее количество и не использует OFFSET, поэтому поле
+    count всегда пустое.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 6
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('count', None),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+
+class RecipeCursorPaginator(CustomCursorPaginator):
+    """Результаты поиска листаются по релевантности, остальные — по дате."""
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', *self.ordering)
+        return super().get_ordering(request, queryset, view)
+
+
+class UserCursorPaginator(CustomCursorPaginator):
+    ordering = ('-id',)
+
+
+class PageNumberOrCursorPaginator(BasePagination):
+    """Постраничная пагинация, а при параметре cursor — по курсору.
+
+    Первую страницу по курсору отдаёт запрос с пустым ?cursor=,
+    ссылки next и previous содержат следующий курсор.
+    """
+    cursor_paginator_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_paginator_class.cursor_query_param
+            in request.query_params
+        ):
+            self.paginator = self.cursor_paginator_class()
+        else:
+            self.paginator = CustomPageNumberPaginator()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class RecipePaginator(PageNumberOrCursorPaginator):
+    cursor_paginator_class = RecipeCursorPaginator
+
+
+class UserPaginator(PageNumberOrCursorPaginator):
+    cursor_paginator_class = UserCursorPaginator
+
+
+class FeedPaginator(CustomCursorPaginator):
+    """Пагинация ленты подписок по курсору.
+
+    Лента собирается из нескольких таблиц, поэтому курсор хранит дату
+    публикации и id последнего рецепта страницы. Лента листается только
+    вперёд, ссылка previous всегда пустая.
+    """
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_feed(self, user, request):
+        """Id рецептов текущей страницы ленты пользователя."""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        positions = feed.get_page(
+            user, self.page_size + 1, self.decode_position(request))
+        self.next_position = None
+        if len(positions) > self.page_size:
+            self.next_position = positions[self.page_size - 1]
+        return [recipe_id for _, recipe_id in positions[:self.page_size]]
+
+    def decode_position(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, recipe_id = b64decode(
+                encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(pub_date), int(recipe_id)
+        except (UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_position(self, position):
+        pub_date, recipe_id = position
+        return b64encode(
+            f'{pub_date.isoformat()}|{recipe_id}'.encode('ascii')
+        ).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_position(self.next_position),
+        )
+
+    def get_previous_link(self):
+        return None
@@ -5,3 +5,9 @@ class IsAuthor(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         return request.user == obj.author
+
+
+class IsAccountOwner(BasePermission):
+
+    def has_object_permission(self, request, view, obj):
+        return request.user == obj or request.user.is_staff
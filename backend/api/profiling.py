@@ -0,0 +1,128 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Профиль, который под ASGI включается в потоке, выполняющем
+# представление, см. api.async_views.
+current_profile = ContextVar('current_profile', default=None)
+
+
+class StackSampler(threading.Thread):
+    """Периодически снимает стек заданного потока.
+
+    Результат — свёрнутые стеки (collapsed stacks) в формате,
+    который принимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}:{}'.format(
+                    frame.f_globals.get('__name__', '?'),
+                    code.co_name,
+                    frame.f_lineno,
+                ))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def get_collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items())
+
+
+class Profile:
+    """Профиль одного запроса: cProfile или сэмплирование стеков.
+
+    Профилируется поток, в котором выполняется блок with.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.profiler = None
+
+    def __enter__(self):
+        if self.mode == 'sample':
+            self.profiler = StackSampler(
+                threading.get_ident(), settings.PROFILER_SAMPLE_INTERVAL)
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == 'sample':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def save(self, request):
+        """Сохраняет профиль и возвращает его идентификатор."""
+        directory = settings.PROFILER_DIR
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r'[^\w]+', '-', request.path).strip('-')[:80]
+        profile_id = '{}-{}-{}-{}'.format(
+            time.strftime('%Y%m%d%H%M%S'),
+            uuid.uuid4().hex[:6],
+            request.method.lower(),
+            slug,
+        )
+        path = os.path.join(directory, profile_id)
+        if self.mode == 'sample':
+            with open(f'{path}.collapsed', 'w') as file:
+                file.write(self.profiler.get_collapsed())
+        else:
+            self.profiler.dump_stats(f'{path}.prof')
+            summary = io.StringIO()
+            pstats.Stats(self.profiler, stream=summary).sort_stats(
+                'cumulative').print_stats(settings.PROFILER_SUMMARY_LINES)
+            with open(f'{path}.txt', 'w') as file:
+                file.write(summary.getvalue())
+        prune(directory)
+        return profile_id
+
+
+def prune(directory):
+    """Удаляет профили старше PROFILER_MAX_AGE и сверх PROFILER_MAX_FILES."""
+    now = time.time()
+    files = []
+    for entry in os.scandir(directory):
+        try:
+            files.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            continue
+    files.sort(reverse=True)
+    for number, (mtime, path) in enumerate(files):
+        if (
+            number >= settings.PROFILER_MAX_FILES
+            or now - mtime > settings.PROFILER_MAX_AGE
+        ):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
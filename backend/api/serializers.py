@@ -1,17 +1,26 @@
 import base64
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+from django.urls import reverse
+from PIL import Image
 from rest_framework import exceptions
+from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
                                         CharField,
                                         ImageField,
                                         IntegerField,
                                         ListField,
+                                        ListSerializer,
                                         ModelSerializer,
                                         Serializer,
                                         SerializerMethodField,
                                         )
 
+from api.fragments import get_fragments
+from recipes import images, shopping_list, similar, tasks
 from recipes.models import (
                             Favorite,
                             Ingredient,
@@ -19,9 +28,37 @@ from recipes.models import (
                             RecipeIngredient,
                             RecipeTag,
                             ShoppingCart,
+                            Subscription,
                             Tag,
                             User,
                             )
+from tasks import queue
+from tasks.models import Task
+
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'RIFF', 'webp'),
+)
+
+
+def get_followed_ids(request):
+    """Id авторов, на которых подписан пользователь запроса.
+
+    Загружаются одним запросом при первом обращении и кешируются
+    на объекте запроса.
+    """
+    followed_ids = getattr(request, '_followed_ids', None)
+    if followed_ids is None:
+        followed_ids = set()
+        if request.user.is_authenticated:
+            followed_ids = set(Subscription.objects.filter(
+                follower=request.user).values_list('author_id', flat=True))
+        request._followed_ids = followed_ids
+    return followed_ids
 
 
 class UserSerializer(ModelSerializer):
@@ -47,11 +84,7 @@ class UserSerializer(ModelSerializer):
         return representation
 
     def get_is_subscribed(self, obj):
-        request_user = self.context.get('request').user
-        return (
-            request_user.is_authenticated
-            and obj.following.filter(follower=request_user).exists()
-        )
+        return obj.id in get_followed_ids(self.context.get('request'))
 
 
 class SetPasswordSerializer(ModelSerializer):
@@ -70,7 +103,7 @@ class SetPasswordSerializer(ModelSerializer):
             raise exceptions.AuthenticationFailed(
                 detail='Старый пароль не совпадает.')
         instance.set_password(new_password)
-        instance.save()
+        instance.save(update_fields=('password',))
         return instance
 
 
@@ -128,25 +161,141 @@ class RecipeIngredientSerializer(ModelSerializer):
 
 
 class Base64ImageField(ImageField):
+    """Изображение в виде data URI.
+
+    Данные декодируются частями во временный файл. Размер ограничен
+    до декодирования, формат проверяется по сигнатуре первой части,
+    габариты — по заголовку файла.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Некорректные данные изображения.',
+        'image_format': 'Неподдерживаемый формат изображения.',
+        'image_size': 'Размер изображения больше {max_size} байт.',
+        'image_dimensions': 'Изображение больше {max_dimension} пикселей.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self._decode(data)
         return super().to_internal_value(data)
 
+    @staticmethod
+    def _get_extension(head):
+        for signature, extension in IMAGE_SIGNATURES:
+            if head.startswith(signature):
+                if extension == 'webp' and head[8:12] != b'WEBP':
+                    return None
+                return extension
+        return None
+
+    def _decode(self, data):
+        header, _, encoded = data.partition(';base64,')
+        # Base64 может быть разбит на строки, а фрагменты для
+        # декодирования должны быть кратны четырём символам.
+        encoded = ''.join(encoded.split())
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(encoded) // 4 * 3 > max_size + 2:
+            self.fail('image_size', max_size=max_size)
+        image_file = TemporaryUploadedFile(
+            'temp', header[len('data:'):], 0, None)
+        try:
+            size = 0
+            extension = None
+            for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    encoded[start:start + BASE64_CHUNK_SIZE], validate=True)
+                if extension is None:
+                    extension = self._get_extension(chunk)
+                    if extension is None:
+                        self.fail('image_format')
+                size += len(chunk)
+                if size > max_size:
+                    self.fail('image_size', max_size=max_size)
+                image_file.write(chunk)
+            image_file.seek(0)
+            max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+            with Image.open(image_file) as image:
+                if max(image.size) > max_dimension:
+                    self.fail('image_dimensions', max_dimension=max_dimension)
+        except (Image.DecompressionBombError, OSError, ValueError):
+            # В том числе binascii.Error и UnidentifiedImageError.
+            image_file.close()
+            self.fail('invalid_base64')
+        except ValidationError:
+            image_file.close()
+            raise
+        image_file.seek(0)
+        image_file.size = size
+        image_file.name = f'temp.{extension}'
+        return image_file
+
+
+class RecipeImageField(ImageField):
+    """Уменьшенная копия изображения рецепта, если она уже создана.
+
+    Копия задаётся параметром rendition или ключом image_rendition
+    контекста, без неё отдаётся оригинал.
+    """
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        rendition = self.rendition or self.context.get(
+            'image_rendition', 'card')
+        return getattr(instance, f'image_{rendition}') or instance.image
+
+
+class AuthorSerializer(ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = (
+            'email',
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+        )
 
-class RecipeSerializer(ModelSerializer):
+
+class RecipeFragmentSerializer(ModelSerializer):
+    """Часть рецепта, не зависящая от пользователя запроса."""
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients', many=True)
-    image = Base64ImageField(required=False, allow_null=True)
+    image = RecipeImageField()
     tags = TagSerializer(many=True)
-    author = UserSerializer(read_only=True)
-    is_favorited = SerializerMethodField()
-    is_in_shopping_cart = SerializerMethodField()
+    author = AuthorSerializer(read_only=True)
 
     class Meta:
         model = Recipe
+        fields = (
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'image',
+            'name',
+            'text',
+            'cooking_time',
+        )
+
+
+class RecipeListSerializer(ListSerializer):
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        return self.child.represent_many(list(iterable), 'card')
+
+
+class RecipeSerializer(RecipeFragmentSerializer):
+    """Рецепт: общая часть из кеша и признаки для пользователя запроса."""
+    is_favorited = SerializerMethodField()
+    is_in_shopping_cart = SerializerMethodField()
+
+    class Meta(RecipeFragmentSerializer.Meta):
         fields = (
             'id',
             'tags',
@@ -159,8 +308,12 @@ class RecipeSerializer(ModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
 
-    def _get_is_in_model(self, obj, model):
+    def _get_is_in_model(self, obj, model, annotation):
+        is_in_model = getattr(obj, annotation, None)
+        if is_in_model is not None:
+            return is_in_model
         request_user = self.context.get('request').user
         return (
             request_user.is_authenticated
@@ -168,21 +321,57 @@ class RecipeSerializer(ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
-        return self._get_is_in_model(obj, Favorite)
+        return self._get_is_in_model(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self._get_is_in_model(obj, ShoppingCart)
+        return self._get_is_in_model(
+            obj, ShoppingCart, 'is_in_shopping_cart')
+
+    def _build_fragments(self, recipes, rendition):
+        prefetch_related_objects(
+            recipes,
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+        return RecipeFragmentSerializer(
+            recipes,
+            many=True,
+            context=dict(self.context, image_rendition=rendition),
+        ).data
+
+    def represent_many(self, recipes, rendition):
+        request = self.context.get('request')
+        fragments = get_fragments(
+            recipes,
+            lambda missing: self._build_fragments(missing, rendition),
+            variant='{}:{}'.format(request.build_absolute_uri('/'), rendition),
+        )
+        if not request.user.is_authenticated:
+            return fragments
+        followed_ids = get_followed_ids(request)
+        return [
+            dict(
+                fragment,
+                author=dict(
+                    fragment['author'],
+                    is_subscribed=recipe.author_id in followed_ids,
+                ),
+                is_favorited=self.get_is_favorited(recipe),
+                is_in_shopping_cart=self.get_is_in_shopping_cart(recipe),
+            )
+            for recipe, fragment in zip(recipes, fragments)
+        ]
 
     def to_representation(self, instance):
-        if self.context.get('request').user.is_authenticated:
-            return super().to_representation(instance)
-        representation = super().to_representation(instance)
-        representation.pop('is_favorited')
-        representation.pop('is_in_shopping_cart')
-        return representation
+        return self.represent_many([instance], 'detail')[0]
 
 
 class RecipeSubscriptionSerializer(ModelSerializer):
+    image = RecipeImageField(rendition='card')
 
     class Meta:
         model = Recipe
@@ -213,20 +402,11 @@ class SubscriptionSerializer(ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return UserSerializer.get_is_subscribed(self, obj)
-
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit')
-        if recipes_limit is None:
-            return representation
-        recipes = representation.pop('recipes')
-        representation['recipes'] = recipes[:int(recipes_limit)]
-        return representation
+        return True
 
 
 class FavoriteShoppingCartRecipeSerializer(ModelSerializer):
+    image = RecipeImageField(rendition='card')
 
     class Meta:
         model = Recipe
@@ -250,70 +430,146 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
             'cooking_time',
         )
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if isinstance(image, TemporaryUploadedFile):
+                image.close()
+
     def to_representation(self, instance):
         custom_request = self.context.get('request')
         representation = RecipeSerializer(
             instance, context={'request': custom_request})
         return representation.data
 
-    def _add_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            id_ingredient = ingredient.get('id')
-            if not Ingredient.objects.filter(id=id_ingredient).exists():
-                raise exceptions.ParseError(detail='Игредиент не найден.')
-            elif (
-                not RecipeIngredient.objects.filter(
-                    ingredient=id_ingredient, recipe=recipe.id).exists()
-            ):
-                ingredient_obj = Ingredient.objects.get(
-                    id=id_ingredient)
-                amount_ingredient = ingredient.get('amount')
-                RecipeIngredient.objects.create(
-                    recipe=recipe,
-                    ingredient=ingredient_obj,
-                    amount=amount_ingredient,
-                )
-
-    def _add_tags(self, tags, recipe):
-        for tag in tags:
-            if not Tag.objects.filter(id=tag).exists():
-                raise exceptions.ParseError(detail='Тег не найден.')
-            elif (
-                not RecipeTag.objects.filter(
-                    recipe=recipe, tag=tag).exists()
-            ):
-                current_tag = Tag.objects.get(id=tag)
-                RecipeTag.objects.create(
-                    recipe=recipe, tag=current_tag)
+    @staticmethod
+    def _check_ids(model, ids, detail):
+        if model.objects.filter(id__in=ids).count() != len(ids):
+            raise exceptions.ParseError(detail=detail)
 
+    def _get_ingredient_amounts(self, ingredients):
+        amounts = {}
+        for ingredient in ingredients:
+            amounts.setdefault(ingredient.get('id'), ingredient.get('amount'))
+        self._check_ids(Ingredient, amounts, 'Игредиент не найден.')
+        return amounts
+
+    def _get_tag_ids(self, tags):
+        tag_ids = set(tags)
+        self._check_ids(Tag, tag_ids, 'Тег не найден.')
+        return tag_ids
+
+    def _add_ingredients(self, amounts, recipe):
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+        )
+        if amounts:
+            similar.change_frequencies(amounts, 1)
+
+    def _add_tags(self, tag_ids, recipe):
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id) for tag_id in tag_ids)
+
+    def _update_ingredients(self, amounts, recipe):
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        changes = {}
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient__in=removed).delete()
+            similar.change_frequencies(removed, -1)
+            for ingredient_id in removed:
+                changes[ingredient_id] = -current[ingredient_id].amount
+        changed = []
+        for ingredient_id in current.keys() & amounts.keys():
+            recipe_ingredient = current[ingredient_id]
+            if recipe_ingredient.amount != amounts[ingredient_id]:
+                changes[ingredient_id] = (
+                    amounts[ingredient_id] - recipe_ingredient.amount)
+                recipe_ingredient.amount = amounts[ingredient_id]
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        }
+        self._add_ingredients(added, recipe)
+        changes.update(added)
+        shopping_list.change_recipe(recipe, changes)
+
+    def _update_tags(self, tag_ids, recipe):
+        current = set(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        removed = current - tag_ids
+        if removed:
+            RecipeTag.objects.filter(recipe=recipe, tag__in=removed).delete()
+        self._add_tags(tag_ids - current, recipe)
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        amounts = self._get_ingredient_amounts(
+            validated_data.pop('ingredients'))
+        tag_ids = self._get_tag_ids(validated_data.pop('tags'))
         recipe = Recipe.objects.create(**validated_data, author=author)
-        self._add_ingredients(ingredients, recipe)
-        self._add_tags(tags, recipe)
+        self._add_ingredients(amounts, recipe)
+        self._add_tags(tag_ids, recipe)
+        if recipe.image:
+            queue.enqueue(tasks.make_renditions, recipe.id)
+        queue.enqueue(tasks.update_similar_recipes, recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        amounts = self._get_ingredient_amounts(
+            validated_data.pop('ingredients'))
+        tag_ids = self._get_tag_ids(validated_data.pop('tags'))
         instance.image = validated_data.get('image', instance.image)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
-        instance.save()
-        RecipeIngredient.objects.filter(recipe=instance.id).delete()
-        self._add_ingredients(ingredients, instance)
-        RecipeTag.objects.filter(recipe=instance).delete()
-        self._add_tags(tags, instance)
+        fields = ['image', 'name', 'text', 'cooking_time']
+        if 'image' in validated_data:
+            # До создания новых копий отдаётся новый оригинал.
+            fields.extend(images.clear_renditions(instance))
+        instance.save(update_fields=fields)
+        self._update_ingredients(amounts, instance)
+        self._update_tags(tag_ids, instance)
+        if 'image' in validated_data:
+            queue.enqueue(tasks.make_renditions, instance.id)
+        queue.enqueue(tasks.update_similar_recipes, instance.id)
         return instance
 
 
-class ShoppingCartDownloadSerializer(ModelSerializer):
-    amount = IntegerField(source='sum_amount')
+class TaskSerializer(ModelSerializer):
+    result = SerializerMethodField()
 
     class Meta:
-        model = Ingredient
-        fields = ('name', 'amount', 'measurement_unit')
+        model = Task
+        fields = (
+            'id',
+            'status',
+            'attempts',
+            'result',
+            'created',
+            'updated',
+        )
+
+    def get_result(self, obj):
+        """Вместо имени файла выгрузки — ссылка на его скачивание."""
+        if isinstance(obj.result, dict) and 'file' in obj.result:
+            url = reverse('tasks-download', args=(obj.id,))
+            request = self.context.get('request')
+            return {
+                'url': request.build_absolute_uri(url) if request else url}
+        return obj.result
@@ -0,0 +1,45 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from api import exporters
+from recipes.models import User
+
+
+def get_export_storage():
+    """Закрытый каталог выгрузок, nginx его не раздаёт."""
+    return FileSystemStorage(location=settings.SHOPPING_LIST_EXPORT_DIR)
+
+
+def prune_exports(storage):
+    """Удаляет выгрузки старше SHOPPING_LIST_EXPORT_MAX_AGE."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_MAX_AGE)
+    for name in storage.listdir('')[1]:
+        try:
+            if storage.get_modified_time(name) < deadline:
+                storage.delete(name)
+        except FileNotFoundError:
+            continue
+
+
+def export_shopping_list(user_id, file_format):
+    """Сохраняет список покупок в каталог выгрузок.
+
+    Файл отдаётся только владельцу задачи по ссылке
+    /api/tasks/<id>/download/.
+    """
+    user = User.objects.get(id=user_id)
+    content = b''.join(
+        chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+        for chunk in exporters.export_shopping_list(user, file_format)
+    )
+    storage = get_export_storage()
+    name = storage.save(
+        f'{uuid.uuid4().hex}.{file_format}', ContentFile(content))
+    prune_exports(storage)
+    return {'file': name}
@@ -0,0 +1,23 @@
+from asgiref.sync import async_to_sync
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from api.async_views import async_read_view
+
+
+class AsyncReadViewTest(SimpleTestCase):
+    """Асинхронная обёртка не собирает потоковые ответы в память."""
+
+    def test_streaming_content_is_not_collected(self):
+        chunks = []
+
+        def stream():
+            for number in range(3):
+                chunks.append(number)
+                yield str(number)
+
+        view = async_read_view(
+            lambda request: StreamingHttpResponse(stream()))
+        response = async_to_sync(view)(RequestFactory().get('/'))
+        self.assertEqual(chunks, [])
+        self.assertEqual(b''.join(response), b'012')
@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from api.tests.utils import create_user
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Токен загружается одним запросом, повторно — из кеша процесса."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = create_user('reader')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+            Token.objects.create(user=self.user).key))
+
+    def get_me(self, queries):
+        # Кроме загрузки токена, профиль читает пользователя и его
+        # подписки.
+        with self.assertNumQueries(queries + 2):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_token_is_loaded_with_user_in_one_query(self):
+        self.get_me(1)
+        self.get_me(1)
+        self.get_me(0)
+
+    def test_changed_user_is_loaded_again(self):
+        self.get_me(1)
+        self.get_me(1)
+        self.get_me(0)
+        self.user.first_name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.get_me(1)
+        self.assertEqual(response.data['first_name'], 'Новое имя')
+        self.get_me(0)
+
+    def test_deleted_token_is_rejected(self):
+        self.get_me(1)
+        self.get_me(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(user=self.user).delete()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.filters import RecipeFilter
+from api.tests.utils import create_recipe, create_tags, create_user
+from recipes.models import Favorite, Recipe
+
+
+class RecipeTagFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        cls.tags = create_tags(3)
+        first, second, third = cls.tags
+        cls.both = create_recipe(author, 'Оба тега', (first, second))
+        cls.all_tags = create_recipe(author, 'Все теги', cls.tags)
+        cls.first = create_recipe(author, 'Первый тег', (first,))
+        cls.third = create_recipe(author, 'Третий тег', (third,))
+        create_recipe(author, 'Без тегов')
+        Favorite.objects.create(user=cls.user, recipe=cls.both)
+        Favorite.objects.create(user=cls.user, recipe=cls.all_tags)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def _get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?limit=6&{query}')
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(response.data['count'], len(ids))
+        return ids
+
+    def test_several_tags_return_each_recipe_once(self):
+        ids = self._get_ids('tags=tag-0&tags=tag-1&tags=tag-2')
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertCountEqual(
+            ids,
+            (self.both.id, self.all_tags.id, self.first.id, self.third.id),
+        )
+
+    def test_tags_with_favorites_return_each_recipe_once(self):
+        self.client.force_authenticate(self.user)
+        ids = self._get_ids('tags=tag-0&tags=tag-1&is_favorited=1')
+        self.assertCountEqual(ids, (self.both.id, self.all_tags.id))
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.get('/api/recipes/?tags=missing')
+        self.assertEqual(response.status_code, 400)
+
+    def test_tag_deleted_after_validation_is_skipped(self):
+        queryset = RecipeFilter().tags_filter(
+            Recipe.objects.all(), 'tags', ['tag-2', 'deleted'])
+        self.assertCountEqual(
+            queryset.values_list('id', flat=True),
+            (self.all_tags.id, self.third.id),
+        )
+
+
+class RecipeSearchTest(TestCase):
+    """Результаты поиска упорядочены по релевантности на всех страницах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        for number in range(3):
+            create_recipe(author, f'Суп {number}')
+        for number in range(3):
+            recipe = create_recipe(author, f'Каша {number}')
+            recipe.text = 'Можно подать вместо супа'
+            recipe.save()
+        create_recipe(author, 'Салат')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_names(self, url, params):
+        names = []
+        while url:
+            response = self.client.get(url, params)
+            params = None
+            self.assertEqual(response.status_code, 200)
+            names.extend(recipe['name'] for recipe in response.data['results'])
+            url = response.data['next']
+        return names
+
+    def test_page_number_pagination(self):
+        names = self.get_names(
+            '/api/recipes/', {'search': 'суп', 'limit': 2})
+        self.assertEqual(names[:3], ['Суп 2', 'Суп 1', 'Суп 0'])
+        self.assertCountEqual(names[3:], ['Каша 0', 'Каша 1', 'Каша 2'])
+
+    def test_cursor_pagination(self):
+        names = self.get_names(
+            '/api/recipes/', {'search': 'суп', 'limit': 2, 'cursor': ''})
+        self.assertEqual(names[:3], ['Суп 2', 'Суп 1', 'Суп 0'])
+        self.assertCountEqual(names[3:], ['Каша 0', 'Каша 1', 'Каша 2'])
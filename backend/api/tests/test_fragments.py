@@ -0,0 +1,121 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import fragments
+from api.tests.utils import (
+                             create_ingredients,
+                             create_recipe,
+                             create_tags,
+                             create_user,
+                             )
+
+
+class ReplicaFragmentsTest(TestCase):
+    """Представления, построенные по реплике, кешируются отдельно."""
+
+    def setUp(self):
+        cache.clear()
+        self.recipes = [create_recipe(create_user('author'), 'Рецепт')]
+        self.build = mock.Mock(side_effect=lambda missing: [
+            {'id': recipe.id} for recipe in missing])
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=7)
+    def test_replica_fragments_are_cached_shortly(self):
+        replica = mock.patch.object(
+            fragments, 'is_replica_read', return_value=True)
+        with replica, mock.patch.object(
+            fragments.cache, 'set_many', wraps=fragments.cache.set_many,
+        ) as set_many:
+            fragments.get_fragments(self.recipes, self.build)
+            fragments.get_fragments(self.recipes, self.build)
+        self.assertEqual(self.build.call_count, 1)
+        self.assertEqual(set_many.call_args[0][1], 7)
+
+    def test_primary_read_ignores_replica_fragments(self):
+        with mock.patch.object(
+            fragments, 'is_replica_read', return_value=True
+        ):
+            fragments.get_fragments(self.recipes, self.build)
+        fragments.get_fragments(self.recipes, self.build)
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_replica_read_uses_primary_fragments(self):
+        fragments.get_fragments(self.recipes, self.build)
+        with mock.patch.object(
+            fragments, 'is_replica_read', return_value=True
+        ):
+            fragments.get_fragments(self.recipes, self.build)
+        self.assertEqual(self.build.call_count, 1)
+
+
+@skipUnless(
+    connections['default'].vendor == 'sqlite', 'Реплика — копия файла SQLite')
+class ReplicaReadYourWritesTest(TransactionTestCase):
+    """Реплика в отдельном файле SQLite, отстающая от основной базы.
+
+    Автор после записи читает с основной базы и видит свои изменения,
+    даже если другой пользователь только что закешировал рецепт по
+    данным реплики.
+    """
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.settings['replica'] = dict(
+            connections.settings['default'],
+            NAME=os.path.join(directory, 'replica.sqlite3'),
+            TEST={},
+        )
+        self.addCleanup(self.remove_replica)
+        settings = override_settings(DATABASE_REPLICAS=['replica'])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        author = create_user('author')
+        self.author = APIClient()
+        self.author.force_authenticate(author)
+        self.reader = APIClient()
+        self.reader.force_authenticate(create_user('reader'))
+        self.tags = create_tags(1)
+        self.ingredients = create_ingredients(1)
+        recipe = create_recipe(
+            author, 'Старое название', self.tags, self.ingredients)
+        self.url = f'/api/recipes/{recipe.id}/'
+        self.copy_to_replica()
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections.settings['replica']
+
+    def copy_to_replica(self):
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(connections.settings['replica']['NAME'])
+        connections['default'].connection.backup(replica)
+        replica.close()
+
+    def get_name(self, client):
+        # Ответ на запись закешировал рецепт для страницы рецепта,
+        # список строит карточки заново.
+        response = client.get('/api/recipes/?limit=6')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0]['name']
+
+    def test_writer_reads_own_changes(self):
+        response = self.author.patch(self.url, {
+            'name': 'Новое название',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 10}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_name(self.reader), 'Старое название')
+        self.assertEqual(self.get_name(self.author), 'Новое название')
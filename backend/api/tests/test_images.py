@@ -0,0 +1,131 @@
+import base64
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api.serializers import Base64ImageField
+from api.tests.utils import (
+                             create_ingredients,
+                             create_recipe,
+                             create_tags,
+                             create_user,
+                             )
+
+
+def make_png(size, noise=False):
+    image = Image.frombytes(
+        'RGB', size, os.urandom(size[0] * size[1] * 3)
+    ) if noise else Image.new('RGB', size)
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_png_header(width, height):
+    """PNG с заголовком огромного изображения и без данных."""
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data))
+        )
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IEND', b'')
+    )
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+
+    def _decode(self, encoded):
+        return Base64ImageField().to_internal_value(
+            f'data:image/png;base64,{encoded}')
+
+    def _assert_invalid(self, encoded, code):
+        with self.assertRaises(ValidationError) as context:
+            self._decode(encoded)
+        self.assertEqual(context.exception.detail[0].code, code)
+
+    def test_decodes_image(self):
+        image = self._decode(base64.b64encode(make_png((10, 10))).decode())
+        self.assertEqual(image.name.split('.')[-1], 'png')
+
+    def test_decodes_base64_wrapped_in_lines(self):
+        content = make_png((200, 200), noise=True)
+        self.assertGreater(len(content), 64 * 1024)
+        image = self._decode(base64.encodebytes(content).decode())
+        self.assertEqual(image.read(), content)
+
+    def test_decompression_bomb_is_rejected(self):
+        self._assert_invalid(
+            base64.b64encode(make_png_header(20000, 20000)).decode(),
+            'invalid_base64',
+        )
+
+    def test_broken_image_is_rejected(self):
+        self._assert_invalid(
+            base64.b64encode(make_png((10, 10))[:40]).decode(),
+            'invalid_base64',
+        )
+
+    def test_invalid_base64_is_rejected(self):
+        self._assert_invalid('iVBORw0KGgo!!!!', 'invalid_base64')
+
+    def test_large_dimensions_are_rejected(self):
+        self._assert_invalid(
+            base64.b64encode(make_png_header(9000, 10)).decode(),
+            'image_dimensions',
+        )
+
+
+class RecipeImageUpdateTest(TestCase):
+    """Новое изображение отдаётся сразу, до создания его копий."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            MEDIA_ROOT=self.directory, TASKS_EAGER=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        author = create_user('author')
+        self.tag = create_tags(1)[0]
+        self.ingredient = create_ingredients(1)[0]
+        self.recipe = create_recipe(
+            author, 'Рецепт', [self.tag], [self.ingredient])
+        for field in ('image', 'image_card', 'image_detail'):
+            getattr(self.recipe, field).save(
+                f'old_{field}.png', ContentFile(make_png((10, 10))))
+        self.client = APIClient()
+        self.client.force_authenticate(author)
+
+    def test_renditions_are_cleared(self):
+        old_renditions = [
+            self.recipe.image_card.path, self.recipe.image_detail.path]
+        encoded = base64.b64encode(make_png((20, 20))).decode()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/recipes/{self.recipe.id}/', {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'image': f'data:image/png;base64,{encoded}',
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image_card)
+        self.assertFalse(self.recipe.image_detail)
+        self.assertTrue(response.data['image'].endswith(
+            self.recipe.image.url))
+        for path in old_renditions:
+            self.assertFalse(os.path.exists(path))
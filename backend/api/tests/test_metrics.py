@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api import metrics
+
+
+class MetricsRegistryTest(SimpleTestCase):
+    """Сбор метрик из файлов процессов и архива."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.registry = metrics.Registry()
+
+    def write(self, name, value, histogram=None):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            json.dump({
+                'values': {'["m", []]': value},
+                'histograms': {'["h", []]': histogram} if histogram else {},
+            }, file)
+        return path
+
+    def get_dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def test_exited_processes_are_archived(self):
+        dead = self.write(
+            f'{self.get_dead_pid()}-1.json', 5,
+            {'buckets': [1, 2], 'sum': 3},
+        )
+        alive = self.write(
+            f'{os.getppid()}-1.json', 2, {'buckets': [0, 1], 'sum': 1})
+        for _ in range(2):
+            values, histograms = self.registry.collect()
+            self.assertEqual(values['["m", []]'], 7)
+            self.assertEqual(
+                histograms['["h", []]'], {'buckets': [1, 3], 'sum': 4})
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.exists(alive))
+        self.assertTrue(os.path.exists(self.registry.path))
+
+    def test_archived_file_is_not_counted_twice(self):
+        dead = self.write(f'{self.get_dead_pid()}-1.json', 5)
+        with mock.patch('os.remove'):
+            self.registry.collect()
+        self.assertTrue(os.path.exists(dead))
+        values, _ = self.registry.collect()
+        self.assertEqual(values['["m", []]'], 5)
+        self.assertFalse(os.path.exists(dead))
+
+    def test_old_files_of_foreign_pids_are_archived(self):
+        old_path = self.write('1-1.json', 2)
+        new_path = self.write('2-1.json', 3)
+        old = time.time() - 2 * 24 * 60 * 60
+        os.utime(old_path, (old, old))
+        with mock.patch('os.kill', side_effect=PermissionError):
+            values, _ = self.registry.collect()
+        self.assertEqual(values['["m", []]'], 5)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(new_path))
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(
+            metrics.escape_label('a\\b"c\nd'), 'a\\\\b\\"c\\nd')
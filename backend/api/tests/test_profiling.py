@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.tests.utils import create_user
+
+
+class ProfilerMiddlewareTest(TestCase):
+    """Профиль запроса сохраняется только для сотрудников."""
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(PROFILER_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff = create_user('staff')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.client = Client()
+
+    def test_session_staff_is_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/tags/?profile=sample')
+        self.assertIn('X-Profile-Id', response)
+        self.assertTrue(os.listdir(self.directory))
+
+    def test_token_staff_is_profiled(self):
+        token = Token.objects.create(user=self.staff)
+        response = self.client.get(
+            '/api/tags/', HTTP_X_PROFILE='cprofile',
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+        self.assertIn('X-Profile-Id', response)
+
+    def test_empty_value_uses_default_mode(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/tags/?profile=')
+        self.assertIn('X-Profile-Id', response)
+
+    def test_other_users_are_not_profiled(self):
+        self.client.force_login(create_user('user'))
+        response = self.client.get('/api/tags/?profile=cprofile')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(os.listdir(self.directory))
@@ -0,0 +1,221 @@
+import base64
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from api.middleware import QueryBudgetExceeded
+from api.tests.test_images import make_png
+from api.tests.utils import (
+                             create_ingredients,
+                             create_recipe,
+                             create_tags,
+                             create_user,
+                             )
+from api.views import RecipeViewSet, UserViewSet
+from recipes import counters, similar
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+IMAGE = 'data:image/png;base64,' + base64.b64encode(
+    make_png((10, 10))).decode()
+
+
+class QueryBudgetTest(TestCase):
+    """Действия укладываются в свои бюджеты запросов.
+
+    Запросы выполняются с токеном при пустых кешах, поэтому в счёт входит
+    и загрузка пользователя. Тесты запускаются с QUERY_BUDGET_STRICT,
+    превышение бюджета приводит к QueryBudgetExceeded.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.follower = create_user('follower')
+        cls.tags = create_tags(2)
+        cls.ingredients = create_ingredients(4)
+        cls.recipes = [
+            create_recipe(
+                cls.author,
+                f'Рецепт {number}',
+                cls.tags[:number % 2 + 1],
+                cls.ingredients[number % 2:],
+            )
+            for number in range(3)
+        ]
+        Subscription.objects.create(follower=cls.user, author=cls.author)
+        Subscription.objects.create(follower=cls.follower, author=cls.author)
+        for recipe in cls.recipes[:2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        counters.reconcile()
+        similar.rebuild()
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(MEDIA_ROOT=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def send(self, viewset, action, method, url, user=None, data=None):
+        cache.clear()
+        token_cache.clear()
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+                Token.objects.get_or_create(user=user)[0].key))
+        response = getattr(client, method)(url, data, format='json')
+        self.assertLess(
+            response.status_code, 300, getattr(response, 'data', None))
+        self.assertLessEqual(
+            response.wsgi_request.query_stats.count,
+            viewset.query_budgets[action],
+        )
+        return response
+
+    def recipe_data(self, **data):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': IMAGE,
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+            **data,
+        }
+
+    def test_exceeded_budget_raises(self):
+        with mock.patch.dict(RecipeViewSet.query_budgets, {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                APIClient().get('/api/recipes/')
+
+    def test_user_list(self):
+        self.send(UserViewSet, 'list', 'get', '/api/users/', self.user)
+
+    def test_user_retrieve(self):
+        self.send(
+            UserViewSet, 'retrieve', 'get',
+            f'/api/users/{self.author.id}/', self.user,
+        )
+
+    def test_user_create(self):
+        self.send(UserViewSet, 'create', 'post', '/api/users/', data={
+            'email': 'new@example.com',
+            'username': 'new',
+            'first_name': 'Новый',
+            'last_name': 'Пользователь',
+            'password': 'Secret-password-1',
+        })
+
+    def test_user_destroy(self):
+        self.send(
+            UserViewSet, 'destroy', 'delete',
+            f'/api/users/{self.follower.id}/', self.follower,
+        )
+
+    def test_user_destroy_by_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.send(
+            UserViewSet, 'destroy', 'delete',
+            f'/api/users/{self.follower.id}/', self.user,
+        )
+
+    def test_user_get_me(self):
+        self.send(UserViewSet, 'get_me', 'get', '/api/users/me/', self.user)
+
+    def test_user_set_password(self):
+        self.send(
+            UserViewSet, 'set_password', 'post', '/api/users/set_password/',
+            self.user,
+            {'current_password': 'password', 'new_password': 'new-password'},
+        )
+
+    def test_user_subscriptions(self):
+        self.send(
+            UserViewSet, 'subscriptions', 'get',
+            '/api/users/subscriptions/?recipes_limit=2', self.user,
+        )
+
+    def test_user_subscribe(self):
+        url = f'/api/users/{self.author.id}/subscribe/?recipes_limit=2'
+        self.send(UserViewSet, 'subscribe', 'delete', url, self.user)
+        self.send(UserViewSet, 'subscribe', 'post', url, self.user)
+
+    def test_recipe_list(self):
+        self.send(RecipeViewSet, 'list', 'get', '/api/recipes/', self.user)
+        self.send(
+            RecipeViewSet, 'list', 'get',
+            f'/api/recipes/?tags={self.tags[0].slug}&is_favorited=1',
+            self.user,
+        )
+
+    def test_recipe_feed(self):
+        self.send(
+            RecipeViewSet, 'feed', 'get', '/api/recipes/feed/', self.user)
+
+    def test_recipe_retrieve(self):
+        self.send(
+            RecipeViewSet, 'retrieve', 'get',
+            f'/api/recipes/{self.recipes[0].id}/', self.user,
+        )
+
+    def test_recipe_similar(self):
+        self.send(
+            RecipeViewSet, 'similar', 'get',
+            f'/api/recipes/{self.recipes[0].id}/similar/', self.user,
+        )
+
+    def test_recipe_create(self):
+        self.send(
+            RecipeViewSet, 'create', 'post', '/api/recipes/', self.author,
+            self.recipe_data(),
+        )
+
+    def test_recipe_update(self):
+        self.send(
+            RecipeViewSet, 'update', 'put',
+            f'/api/recipes/{self.recipes[1].id}/', self.author,
+            self.recipe_data(),
+        )
+
+    def test_recipe_partial_update(self):
+        self.send(
+            RecipeViewSet, 'partial_update', 'patch',
+            f'/api/recipes/{self.recipes[1].id}/', self.author,
+            self.recipe_data(),
+        )
+
+    def test_recipe_destroy(self):
+        self.send(
+            RecipeViewSet, 'destroy', 'delete',
+            f'/api/recipes/{self.recipes[0].id}/', self.author,
+        )
+
+    def test_recipe_favorite(self):
+        url = f'/api/recipes/{self.recipes[2].id}/favorite/'
+        self.send(RecipeViewSet, 'favorite', 'post', url, self.user)
+        self.send(RecipeViewSet, 'favorite', 'delete', url, self.user)
+
+    def test_recipe_shopping_cart(self):
+        url = f'/api/recipes/{self.recipes[2].id}/shopping_cart/'
+        self.send(RecipeViewSet, 'shopping_cart', 'post', url, self.user)
+        self.send(RecipeViewSet, 'shopping_cart', 'delete', url, self.user)
+
+    def test_recipe_download_shopping_cart(self):
+        url = '/api/recipes/download_shopping_cart/'
+        for renderer_format in ('txt', 'pdf'):
+            self.send(
+                RecipeViewSet, 'download_shopping_cart', 'get',
+                f'{url}?format={renderer_format}', self.user,
+            )
@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.utils import (
+                             create_ingredients,
+                             create_recipe,
+                             create_tags,
+                             create_user,
+                             )
+from recipes import counters, similar
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        tags = create_tags(3)
+        ingredients = create_ingredients(5)
+        authors = [create_user(f'author{number}') for number in range(3)]
+        for number in range(12):
+            recipe = create_recipe(
+                authors[number % 3],
+                f'Рецепт {number}',
+                tags[:number % 3 + 1],
+                ingredients[:number % 5 + 1],
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(follower=cls.user, author=authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def _count_queries(self, limit):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/recipes/?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context)
+
+    def test_anonymous_queries_do_not_depend_on_page_size(self):
+        self.assertEqual(self._count_queries(1), self._count_queries(6))
+
+    def test_authenticated_queries_do_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self._count_queries(1), self._count_queries(6))
+
+    def test_authenticated_query_count(self):
+        self.client.force_authenticate(self.user)
+        # Количество, страница, теги, ингредиенты, подписки.
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/recipes/?limit=6')
+        flags = {
+            recipe['name']: (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'],
+            )
+            for recipe in response.data['results']
+        }
+        self.assertEqual(flags['Рецепт 11'], (True, True, False))
+        self.assertEqual(flags['Рецепт 9'], (True, False, True))
+        self.assertEqual(flags['Рецепт 6'], (False, False, True))
+
+
+class SimilarRecipesTest(TestCase):
+    """Похожие рецепты, от более похожих к менее похожим."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        ingredients = create_ingredients(4)
+        cls.recipe = create_recipe(author, 'Рецепт', (), ingredients[:3])
+        cls.close = create_recipe(author, 'Близкий', (), ingredients[:2])
+        cls.far = create_recipe(author, 'Дальний', (), ingredients[2:])
+        counters.reconcile()
+        similar.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_recipes_are_ordered_by_score(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f'/api/recipes/{self.recipe.id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data],
+            [self.close.id, self.far.id],
+        )
+
+    def test_unknown_recipe_returns_404(self):
+        for pk in ('abc', '0', '1e3'):
+            response = self.client.get(f'/api/recipes/{pk}/similar/')
+            self.assertEqual(response.status_code, 404)
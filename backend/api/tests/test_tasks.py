@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.tests.utils import (
+                             create_ingredients,
+                             create_recipe,
+                             create_user,
+                             )
+from recipes.models import User
+
+
+class ShoppingListExportTest(TestCase):
+    """Выгрузка списка покупок доступна только автору задачи."""
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            SHOPPING_LIST_EXPORT_DIR=self.directory,
+            SHOPPING_LIST_BACKGROUND_FORMATS=('txt',),
+            TASKS_EAGER=True,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = create_user('buyer')
+        recipe = create_recipe(
+            create_user('author'), 'Рецепт', (), create_ingredients(1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/',
+                HTTP_ACCEPT='text/plain',
+            )
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response.data['status_url']).data
+
+    def test_owner_downloads_file(self):
+        task = self.export()
+        url = task['result']['url']
+        self.assertTrue(url.endswith(f'/api/tasks/{task["id"]}/download/'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Ингредиент 0', b''.join(response).decode('utf-8'))
+
+    def test_other_user_gets_404(self):
+        task = self.export()
+        self.client.force_authenticate(create_user('stranger'))
+        response = self.client.get(task['result']['url'])
+        self.assertEqual(response.status_code, 404)
+
+    def test_expired_files_are_pruned(self):
+        old_task = self.export()
+        (name,) = os.listdir(self.directory)
+        old = time.time() - 2 * 24 * 60 * 60
+        os.utime(os.path.join(self.directory, name), (old, old))
+        self.export()
+        self.assertNotIn(name, os.listdir(self.directory))
+        response = self.client.get(old_task['result']['url'])
+        self.assertEqual(response.status_code, 404)
+
+
+class UserDestroyTest(TestCase):
+    """Удаление своего аккаунта не отдаёт ссылку на недоступный статус."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    @override_settings(TASKS_EAGER=True)
+    def test_self_deletion_returns_204(self):
+        user = create_user('leaver')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/users/{user.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+
+    def test_staff_deletion_returns_status_url(self):
+        admin = create_user('admin')
+        admin.is_staff = True
+        admin.save()
+        user = create_user('leaver')
+        self.client.force_authenticate(admin)
+        response = self.client.delete(f'/api/users/{user.id}/')
+        self.assertEqual(response.status_code, 202)
+        status = self.client.get(response.data['status_url'])
+        self.assertEqual(status.status_code, 200)
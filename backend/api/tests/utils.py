@@ -0,0 +1,53 @@
+from recipes.models import (
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            RecipeTag,
+                            Tag,
+                            User,
+                            )
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        first_name=username,
+        last_name=username,
+    )
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f'Тег {number}',
+            color=f'#{number:06x}',
+            slug=f'tag-{number}',
+        )
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, name, tags=(), ingredients=()):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Описание',
+        cooking_time=10,
+    )
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=recipe, tag=tag) for tag in tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import make_async_patterns
 from api.views import (
+                       MetricsView,
                        RecipeViewSet,
                        UserViewSet,
                        TagViewSet,
+                       TaskViewSet,
                        IngredientViewsSet
                        )
 
@@ -17,8 +21,25 @@ router.register('users', UserViewSet, basename='users')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewsSet, basename='ingredients')
+router.register('tasks', TaskViewSet, basename='tasks')
+
+# Под ASGI эти маршруты обслуживаются асинхронными обёртками. Выгрузка
+# списка покупок читает базу по ходу потоковой отдачи и сюда не входит.
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+)
+
+router_urls = router.urls
+if settings.ASGI_MODE:
+    router_urls = make_async_patterns(router_urls, ASYNC_ROUTES)
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include(router.urls)),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('', include(router_urls)),
 ]
@@ -1,11 +1,26 @@
 from django.conf import settings
-from django.db.models import Count, Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (
+                              Exists,
+                              F,
+                              OuterRef,
+                              Prefetch,
+                              Window,
+                              prefetch_related_objects,
+                              )
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.mixins import RetrieveModelMixin
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.viewsets import (
+                                     GenericViewSet,
                                      ModelViewSet,
                                      ReadOnlyModelViewSet,
                                      )
@@ -16,16 +31,53 @@ from rest_framework.permissions import (
                                         SAFE_METHODS
                                         )
 
-from api import paginators, serializers
+from api import (
+                 exporters,
+                 metrics,
+                 paginators,
+                 renderers,
+                 serializers,
+                 tasks,
+                 )
 from api.filters import RecipeFilter
-from api.permissions import IsAuthor
+from api.mixins import ConditionalGetMixin, ReplicaReadMixin
+from api.permissions import IsAccountOwner, IsAuthor
 from recipes import models
+from recipes import tasks as recipe_tasks
+from recipes.autocomplete import ingredient_index
+from tasks import queue
+from tasks.models import Task
 
 
-class UserViewSet(ModelViewSet):
+def get_accepted_response(request, task):
+    """Ответ 202 со ссылкой на статус поставленной задачи."""
+    status_url = request.build_absolute_uri(
+        reverse('tasks-detail', args=(task.id,)))
+    data = serializers.TaskSerializer(
+        task, context={'request': request}).data
+    data['status_url'] = status_url
+    return Response(
+        data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': status_url},
+    )
+
+
+class UserViewSet(ReplicaReadMixin, ModelViewSet):
     queryset = models.User.objects.all()
     serializer_class = serializers.UserSerializer
-    pagination_class = paginators.CustomPageNumberPaginator
+    pagination_class = paginators.UserPaginator
+    replica_actions = ('subscriptions',)
+    query_budgets = {
+        'list': 5,
+        'retrieve': 4,
+        'create': 4,
+        'destroy': 7,
+        'get_me': 4,
+        'set_password': 4,
+        'subscriptions': 5,
+        'subscribe': 12,
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -36,11 +88,23 @@ class UserViewSet(ModelViewSet):
         if self.action in settings.USER_ACTIONS_ALLOW_ANY:
             permission_classes = (AllowAny,)
         elif self.action in settings.USER_ACTIONS_IS_AUTHOR:
-            permission_classes = (IsAuthor,)
+            permission_classes = (IsAuthenticated, IsAccountOwner)
         else:
             permission_classes = (IsAuthenticated,)
         return (permission() for permission in permission_classes)
 
+    def destroy(self, request, *args, **kwargs):
+        user = self.get_object()
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=('is_active',))
+            task = queue.enqueue(
+                recipe_tasks.delete_user, user.id, user=request.user)
+        if user == request.user:
+            # Отключённый пользователь уже не сможет узнать статус задачи.
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return get_accepted_response(request, task)
+
     @action(detail=False, url_path='me', permission_classes=(IsAuthenticated,))
     def get_me(self, request):
         me = models.User.objects.get(username=request.user)
@@ -66,25 +130,52 @@ class UserViewSet(ModelViewSet):
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _prefetch_recipes(self, authors):
+        """Загружает рецепты авторов с учётом recipes_limit.
+
+        Лимит применяется в базе: рецепты каждого автора нумеруются
+        оконной функцией и отбираются первые recipes_limit.
+        """
+        recipes = models.Recipe.objects.all()
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is not None and recipes_limit.isdigit():
+            ranked = models.Recipe.objects.filter(
+                author__in=authors
+            ).annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=(F('pub_date').desc(), F('id').desc()),
+                )
+            ).order_by().values('id', 'row_number')
+            sql, params = ranked.query.sql_with_params()
+            recipes = recipes.filter(id__in=RawSQL(
+                f'SELECT id FROM ({sql}) ranked WHERE row_number <= %s',
+                (*params, int(recipes_limit)),
+            ))
+        prefetch_related_objects(
+            authors, Prefetch('recipes', queryset=recipes))
+
     @action(
         detail=False,
         permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request):
         queryset = models.User.objects.filter(
-            following__follower=request.user.id).prefetch_related(
-                'recipes').annotate(
-                    recipes_count=Count('recipes'))
+            following__follower=request.user.id)
         page = self.paginate_queryset(queryset)
         if page is not None:
+            self._prefetch_recipes(page)
             serializer = serializers.SubscriptionSerializer(
                 page,
                 context={'request': request},
                 many=True,
             )
             return self.get_paginated_response(serializer.data)
+        authors = list(queryset)
+        self._prefetch_recipes(authors)
         serializer = serializers.SubscriptionSerializer(
-            queryset,
+            authors,
             context={'request': request},
             many=True,
         )
@@ -114,10 +205,10 @@ class UserViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         if models.User.objects.filter(id=pk).exists():
-            author = models.User.objects.filter(id=pk).annotate(
-                recipes_count=Count('recipes')).first()
+            author = models.User.objects.get(id=pk)
             models.Subscription.objects.create(
                 author=author, follower=self.request.user)
+            self._prefetch_recipes((author,))
             serializer = serializers.SubscriptionSerializer(
                 author, context={'request': request})
             return Response(
@@ -128,27 +219,64 @@ class UserViewSet(ModelViewSet):
         )
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = models.Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    replica_actions = ('list', 'retrieve')
 
 
-class IngredientViewsSet(ReadOnlyModelViewSet):
+class IngredientViewsSet(
+    ReplicaReadMixin, ConditionalGetMixin, ReadOnlyModelViewSet
+):
     queryset = models.Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('name',)
+    # list отвечает из индекса, который строится по основной базе.
+    replica_actions = ('retrieve',)
+
+    def search(self, request):
+        limit = request.query_params.get('limit')
+        return Response(ingredient_index.search(
+            request.query_params.get(api_settings.SEARCH_PARAM, ''),
+            int(limit) if limit and limit.isdigit() else None,
+        ))
 
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(self.search, request)
 
-class RecipeViewSet(ModelViewSet):
-    queryset = models.Recipe.objects.prefetch_related(
-        'recipe_ingredients__ingredient')
+
+class RecipeViewSet(ReplicaReadMixin, ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = paginators.CustomPageNumberPaginator
+    pagination_class = paginators.RecipePaginator
+    replica_actions = ('list', 'retrieve', 'feed', 'similar')
+    query_budgets = {
+        'list': 8,
+        'feed': 8,
+        'retrieve': 6,
+        'similar': 3,
+        'create': 23,
+        'update': 24,
+        'partial_update': 24,
+        'destroy': 27,
+        'favorite': 9,
+        'shopping_cart': 14,
+        'download_shopping_cart': 4,
+    }
+
+    def get_queryset(self):
+        queryset = models.Recipe.objects.select_related('author')
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(models.Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(models.ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
 
     def get_serializer_class(self):
-        if self.action == 'list' or self.action == 'retrieve':
+        if self.action in ('list', 'retrieve', 'feed'):
             return serializers.RecipeSerializer
         return serializers.RecipeCreateUpdateSerializer
 
@@ -165,7 +293,9 @@ class RecipeViewSet(ModelViewSet):
         queryset = model.objects.filter(
             recipe=pk, user=self.request.user)
         if request.method == 'DELETE':
-            queryset.delete()
+            # Список покупок обновляют обработчики сигналов корзины.
+            with transaction.atomic():
+                queryset.delete()
             message = {'detail': 'Удалён из списка.'}
             response_status = status.HTTP_204_NO_CONTENT
             return message, response_status
@@ -175,8 +305,9 @@ class RecipeViewSet(ModelViewSet):
             return message, response_status
         if models.Recipe.objects.filter(id=pk).exists():
             recipe = models.Recipe.objects.get(id=pk)
-            model.objects.create(
-                recipe=recipe, user=self.request.user)
+            with transaction.atomic():
+                model.objects.create(
+                    recipe=recipe, user=self.request.user)
             serializer = serializers.FavoriteShoppingCartRecipeSerializer(
                 recipe, context={'request': request})
             response_data = serializer.data
@@ -205,19 +336,85 @@ class RecipeViewSet(ModelViewSet):
             request, pk, models.ShoppingCart))
 
     @action(detail=False)
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        paginator = paginators.FeedPaginator()
+        recipe_ids = paginator.paginate_feed(request.user, request)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        """Рецепты с похожим набором ингредиентов, от более похожих."""
+        if not pk.isdigit():
+            raise Http404
+        similar = models.SimilarRecipe.objects.filter(
+            recipe=pk).select_related('similar').order_by('-score')
+        recipes = [similar_recipe.similar for similar_recipe in similar]
+        if not recipes and not models.Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = serializers.FavoriteShoppingCartRecipeSerializer(
+            recipes, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        renderer_classes=renderers.SHOPPING_LIST_RENDERERS,
+    )
     def download_shopping_cart(self, request):
-        user_id = request.user.id
-        ingredients = models.Ingredient.objects.filter(
-            recipe_ingredients__recipe_id__shopping_cart_recipes__user=user_id
-        ).prefetch_related('recipe_ingredients').annotate(
-            sum_amount=Sum('recipe_ingredients__amount'))
-        serializer = serializers.ShoppingCartDownloadSerializer(
-            ingredients, many=True)
-        content = '***СПИСОК ПОКУПОК***\n\n'
-        for val in serializer.data:
-            content += '* {}: {} {}\n'.format(
-                val['name'], val['amount'], val['measurement_unit'])
-        return HttpResponse(
-            content=content,
-            content_type='text/plain'
+        renderer = request.accepted_renderer
+        if renderer.format in settings.SHOPPING_LIST_BACKGROUND_FORMATS:
+            task = queue.enqueue(
+                tasks.export_shopping_list,
+                request.user.id,
+                renderer.format,
+                user=request.user,
+            )
+            request.accepted_renderer = renderers.JsonShoppingListRenderer()
+            request.accepted_media_type = request.accepted_renderer.media_type
+            return get_accepted_response(request, task)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            exporters.export_shopping_list(request.user, renderer.format),
+            content_type=content_type,
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"')
+        return response
+
+
+class TaskViewSet(RetrieveModelMixin, GenericViewSet):
+    serializer_class = serializers.TaskSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Task.objects.filter(user=self.request.user)
+
+    @action(detail=True)
+    def download(self, request, pk):
+        """Файл выгрузки, который сохранила задача."""
+        task = self.get_object()
+        name = task.result.get('file') if isinstance(
+            task.result, dict) else None
+        storage = tasks.get_export_storage()
+        if name is None or not storage.exists(name):
+            raise Http404
+        return FileResponse(
+            storage.open(name),
+            as_attachment=True,
+            filename=f'shopping_list.{name.rsplit(".", 1)[-1]}',
+        )
+
+
+class MetricsView(APIView):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    renderer_classes = (renderers.MetricsRenderer,)
+
+    def get(self, request):
+        return Response(metrics.registry.render())
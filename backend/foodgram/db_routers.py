@@ -0,0 +1,60 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY = 'default'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def start_replica_read():
+    """Направляет чтение в текущем контексте на случайную реплику."""
+    return _read_alias.set(random.choice(settings.DATABASE_REPLICAS))
+
+
+def stop_replica_read(token):
+    _read_alias.reset(token)
+
+
+def is_replica_read():
+    return _read_alias.get() is not None
+
+
+def _get_sticky_key(user_id):
+    return f'db-primary:{user_id}'
+
+
+def stick_to_primary(user_id):
+    """После записи пользователь читает с основной базы ещё какое-то время.
+
+    Так он сразу видит свои изменения, даже если реплика отстаёт.
+    """
+    cache.set(
+        _get_sticky_key(user_id),
+        True,
+        timeout=settings.DATABASE_REPLICA_STICKY_SECONDS,
+    )
+
+
+def is_sticky(user_id):
+    return cache.get(_get_sticky_key(user_id), False)
+
+
+class ReplicaRouter:
+    """Запись — в основную базу, чтение — туда же или в реплику.
+
+    Реплика используется только внутри start_replica_read, его вызывает
+    ReplicaReadMixin для действий вьюсета, перечисленных в
+    replica_actions.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
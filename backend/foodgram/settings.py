@@ -31,15 +31,19 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'tasks.apps.TasksConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,6 +68,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Устанавливается в foodgram.asgi: под ASGI часть маршрутов API
+# обслуживается асинхронными представлениями из api.async_views.
+ASGI_MODE = os.getenv('ASGI_MODE', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE'),
@@ -75,6 +85,39 @@ DATABASES = {
     }
 }
 
+# Реплики перечисляются через запятую: хосты PostgreSQL или файлы SQLite.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if 'sqlite3' in (DATABASES['default']['ENGINE'] or ''):
+        DATABASES[alias]['NAME'] = location.strip()
+    else:
+        DATABASES[alias]['HOST'] = location.strip()
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60 * 24
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -95,7 +138,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'SEARCH_PARAM': 'name'
 
@@ -111,6 +154,62 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+SHOPPING_LIST_BACKGROUND_FORMATS = ('pdf',)
+# Выгрузки из фоновых задач отдаются владельцу через API и удаляются
+# через сутки.
+SHOPPING_LIST_EXPORT_DIR = os.getenv(
+    'SHOPPING_LIST_EXPORT_DIR', os.path.join(BASE_DIR, '.exports'))
+SHOPPING_LIST_EXPORT_MAX_AGE = 24 * 60 * 60
+
+# Рецепты авторов, у которых подписчиков больше, в ленты не рассылаются.
+FEED_FAN_OUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FAN_OUT_MAX_FOLLOWERS', 1000))
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = 50
+
+# Сколько похожих рецептов хранится для каждого рецепта.
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', 10))
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_DIMENSION = 8000
+RECIPE_IMAGE_RENDITION_FORMAT = 'WEBP'
+RECIPE_IMAGE_RENDITIONS = {
+    'card': (600, 600),
+    'detail': (1200, 1200),
+}
+
+QUERY_TIMING_HEADERS = os.getenv('QUERY_TIMING_HEADERS', 'False') == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+# Тестовый раннер включает QUERY_BUDGET_STRICT.
+TEST_RUNNER = 'foodgram.test_runner.StrictQueryBudgetRunner'
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 1024))
+AUTH_TOKEN_CACHE_TTL = 300
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, '.metrics'))
+METRICS_FLUSH_INTERVAL = 1
+METRICS_MAX_AGE = 24 * 60 * 60
+
+PROFILER_QUERY_PARAM = 'profile'
+PROFILER_HEADER = 'X-Profile'
+PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(BASE_DIR, '.profiles'))
+PROFILER_MAX_FILES = 200
+PROFILER_MAX_AGE = 7 * 24 * 60 * 60
+PROFILER_SAMPLE_INTERVAL = 0.001
+PROFILER_SUMMARY_LINES = 60
+
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False') == 'True'
+TASKS_CONCURRENCY = 4
+TASKS_POLL_INTERVAL = 1
+TASKS_MAX_ATTEMPTS = 3
+TASKS_RETRY_DELAY = 30
+TASKS_VISIBILITY_TIMEOUT = 300
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^api/.*$'
 
@@ -127,6 +226,6 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 USER_ACTIONS_ALLOW_ANY = ('list', 'retrive', 'create')
-USER_ACTIONS_IS_AUTHOR = ('delete',)
+USER_ACTIONS_IS_AUTHOR = ('destroy',)
 RECIPE_ACTIONS_IS_AUTHENTICATED = (
-    'favorite', 'shopping_cart', 'download_shopping_cart', 'create')
+    'favorite', 'shopping_cart', 'download_shopping_cart', 'create', 'feed')
@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
 
 from recipes import models
 
@@ -19,15 +21,28 @@ class IngredientInLine(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeTagInLine, IngredientInLine)
     list_display = (
-        'id', 'name', 'text', 'author', 'cooking_time', 'pub_date'
+        'id', 'name', 'text', 'author', 'cooking_time', 'pub_date',
+        'favorites_count', 'in_carts_count',
     )
     list_editable = (
         'name', 'text', 'author', 'cooking_time',
     )
+    readonly_fields = ('favorites_count', 'in_carts_count')
     search_field = ('name', 'tag', 'author')
     list_filter = ('author', 'name', 'tags__name')
     empty_value_display = '--пусто--'
 
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'author' in form.changed_data:
+            # Рецепт переходит к другому автору.
+            models.User.objects.filter(
+                pk=form.initial['author'], recipes_count__gt=0
+            ).update(recipes_count=F('recipes_count') - 1)
+            models.User.objects.filter(pk=obj.author_id).update(
+                recipes_count=F('recipes_count') + 1)
+
 
 @admin.register(models.Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -0,0 +1,66 @@
+import bisect
+import threading
+
+from foodgram.db_routers import PRIMARY
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+
+class IngredientIndex:
+    """Индекс для подсказок по названиям ингредиентов.
+
+    Хранит отсортированный список названий в нижнем регистре, строится
+    при первом поиске и перестраивается, когда меняется версия
+    ингредиентов, в том числе после изменений в других процессах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._version = None
+
+    def _get_entries(self):
+        version = get_version(Ingredient)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._entries = self._build()
+                    self._version = version
+        return self._entries
+
+    def _build(self):
+        ingredients = [
+            {'id': id, 'name': name, 'measurement_unit': measurement_unit}
+            for id, name, measurement_unit in Ingredient.objects.using(
+                PRIMARY
+            ).order_by('id').values_list('id', 'name', 'measurement_unit')
+        ]
+        by_name = sorted(
+            ingredients,
+            key=lambda item: (item['name'].lower(), item['id']),
+        )
+        keys = [ingredient['name'].lower() for ingredient in by_name]
+        return ingredients, by_name, keys
+
+    def search(self, query='', limit=None):
+        """Сначала совпадения с начала названия, затем по подстроке."""
+        ingredients, by_name, keys = self._get_entries()
+        query = query.strip().lower()
+        if not query:
+            return ingredients[:limit]
+        results = []
+        position = bisect.bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            if limit is not None and len(results) >= limit:
+                return results
+            results.append(by_name[position])
+            position += 1
+        for key, ingredient in zip(keys, by_name):
+            if limit is not None and len(results) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                results.append(ingredient)
+        return results
+
+
+ingredient_index = IngredientIndex()
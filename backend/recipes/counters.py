@@ -0,0 +1,47 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import (
+                            Favorite,
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            ShoppingCart,
+                            Subscription,
+                            User,
+                            )
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (Ingredient, 'recipes_count', RecipeIngredient, 'ingredient'),
+)
+
+
+def _get_actual(related_model, field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def get_drift():
+    """Количество объектов с неверным значением каждого счётчика."""
+    return {
+        f'{model._meta.label}.{counter}': model.objects.annotate(
+            actual=_get_actual(related_model, field)
+        ).exclude(**{counter: F('actual')}).count()
+        for model, counter, related_model, field in COUNTERS
+    }
+
+
+def reconcile():
+    for model, counter, related_model, field in COUNTERS:
+        model.objects.update(**{counter: _get_actual(related_model, field)})
@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import FeedEntry, Recipe, Subscription, User
+
+
+def is_popular(author_id):
+    """Рецепты автора не рассылаются по лентам, а читаются при запросе.
+
+    Так публикация рецепта автором с большим числом подписчиков не
+    создаёт записи в лентах каждого из них.
+    """
+    return User.objects.filter(
+        pk=author_id,
+        followers_count__gt=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def _create_entries(follower_ids, recipes):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                follower_id=follower_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for follower_id in follower_ids
+            for recipe_id, author_id, pub_date in recipes
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def _get_latest_recipes(author_id):
+    return Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'author_id', 'pub_date')
+
+
+def add_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    if is_popular(recipe.author_id):
+        return
+    _create_entries(
+        Subscription.objects.filter(
+            author_id=recipe.author_id).values_list('follower_id', flat=True),
+        ((recipe.id, recipe.author_id, recipe.pub_date),),
+    )
+
+
+def add_author(follower_id, author_id):
+    """Переносит в ленту подписчика последние рецепты автора."""
+    if not is_popular(author_id):
+        _create_entries(
+            (follower_id,),
+            _get_latest_recipes(author_id)[:settings.FEED_BACKFILL_SIZE],
+        )
+
+
+def remove_author(follower_id, author_id):
+    FeedEntry.objects.filter(
+        follower_id=follower_id, author_id=author_id).delete()
+
+
+@transaction.atomic
+def add_author_to_followers(author_id, limit=None):
+    """Заполняет ленты всех подписчиков автора.
+
+    Нужна, когда автор перестаёт быть популярным: пока он был
+    популярным, подписчики читали все его рецепты из таблицы рецептов,
+    поэтому без limit в ленты переносятся все рецепты автора, частями
+    по FEED_BACKFILL_SIZE.
+    """
+    if is_popular(author_id):
+        return
+    follower_ids = list(Subscription.objects.filter(
+        author_id=author_id).values_list('follower_id', flat=True))
+    if limit is not None:
+        _create_entries(
+            follower_ids, list(_get_latest_recipes(author_id)[:limit]))
+        return
+    recipes = []
+    for recipe in _get_latest_recipes(author_id).iterator(
+        chunk_size=settings.FEED_BACKFILL_SIZE
+    ):
+        recipes.append(recipe)
+        if len(recipes) == settings.FEED_BACKFILL_SIZE:
+            _create_entries(follower_ids, recipes)
+            recipes = []
+    _create_entries(follower_ids, recipes)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересобирает ленты всех пользователей по подпискам."""
+    FeedEntry.objects.all().delete()
+    for author_id in User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lte=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+    ).values_list('id', flat=True).iterator():
+        add_author_to_followers(author_id, settings.FEED_BACKFILL_SIZE)
+
+
+def _older_than(position, id_field):
+    if position is None:
+        return Q()
+    pub_date, recipe_id = position
+    # Условие pub_date__lte позволяет базе читать индекс с позиции.
+    return Q(pub_date__lte=pub_date) & (
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, **{f'{id_field}__lt': recipe_id})
+    )
+
+
+def get_page(user, limit, before=None):
+    """Позиции (дата публикации, id рецепта) страницы ленты.
+
+    Возвращает не больше limit позиций старше before, от новых к
+    старым. Рецепты обычных авторов читаются из ленты, рецепты
+    популярных — из таблицы рецептов, оба запроса идут по индексам.
+    """
+    timeline = FeedEntry.objects.filter(
+        _older_than(before, 'recipe_id'),
+        follower=user,
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit]
+    popular = Recipe.objects.filter(
+        _older_than(before, 'id'),
+        author__in=Subscription.objects.filter(
+            follower=user,
+            author__followers_count__gt=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+        ).values('author_id'),
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    # Рецепты автора, ставшего популярным, остаются в лентах.
+    return sorted({*timeline, *popular}, reverse=True)[:limit]
@@ -0,0 +1,62 @@
+import os
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def clear_renditions(recipe):
+    """Очищает поля копий изображения рецепта, не сохраняя рецепт.
+
+    Файлы копий удаляются после фиксации транзакции. Возвращает имена
+    очищенных полей.
+    """
+    fields = []
+    for name in settings.RECIPE_IMAGE_RENDITIONS:
+        field = f'image_{name}'
+        rendition = getattr(recipe, field)
+        if rendition:
+            transaction.on_commit(
+                partial(rendition.storage.delete, rendition.name))
+        setattr(recipe, field, None)
+        fields.append(field)
+    return fields
+
+
+def make_renditions(recipe):
+    """Создаёт уменьшенные копии изображения рецепта рядом с оригиналом.
+
+    Старые копии удаляются, у рецепта без изображения поля очищаются.
+    """
+    image_format = settings.RECIPE_IMAGE_RENDITION_FORMAT
+    fields = []
+    for name in settings.RECIPE_IMAGE_RENDITIONS:
+        field = f'image_{name}'
+        getattr(recipe, field).delete(save=False)
+        fields.append(field)
+    if recipe.image:
+        stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+        with recipe.image.open('rb'), Image.open(recipe.image) as original:
+            original = ImageOps.exif_transpose(original)
+            mode = 'RGB'
+            if image_format == 'WEBP' and (
+                'A' in original.getbands() or original.mode == 'P'
+            ):
+                mode = 'RGBA'
+            original = original.convert(mode)
+            for name, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+                rendition = original.copy()
+                rendition.thumbnail(size)
+                buffer = BytesIO()
+                rendition.save(buffer, image_format, quality=85)
+                getattr(recipe, f'image_{name}').save(
+                    f'{stem}_{name}.{EXTENSIONS[image_format]}',
+                    ContentFile(buffer.getvalue()),
+                    save=False,
+                )
+    recipe.save(update_fields=fields)
@@ -1,19 +1,137 @@
+import csv
 import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.versions import bump_version
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json(file):
+    """Поэлементно разбирает JSON-массив, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise CommandError('Ожидался JSON-массив.')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Некорректный JSON.')
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item.get('name'), item.get('measurement_unit')
+        position = end
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1]
+
+
+READERS = {
+    'json': iter_json,
+    'csv': iter_csv,
+}
 
 
 class Command(BaseCommand):
     help = 'Команда для загрузки списка ингредиентов в базу данных'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='ingredients.json',
+            help='Путь к файлу ингредиентов (JSON или CSV).',
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS.keys(),
+            help='Формат файла, по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT.',
+        )
+        parser.add_argument(
+            '--update-units',
+            action='store_true',
+            help='Обновлять единицы измерения существующих ингредиентов.',
+        )
+
     def handle(self, *args, **options):
-        with open('ingredients.json') as file:
-            ingredients = json.load(file)
-        for ingredient in ingredients:
-            name = ingredient.get('name')
-            measurement_unit = ingredient.get('measurement_unit')
-            if not Ingredient.objects.filter(name=name).exists():
-                Ingredient.objects.create(
-                    name=name, measurement_unit=measurement_unit)
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}.')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть положительным.')
+        count_before = Ingredient.objects.count()
+        started = time.perf_counter()
+        processed = updated = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            batch = {}
+            for name, measurement_unit in READERS[file_format](file):
+                if not name or not measurement_unit:
+                    continue
+                batch[name] = measurement_unit
+                processed += 1
+                if len(batch) >= batch_size:
+                    updated += self._save(batch, options['update_units'])
+                    batch = {}
+            if batch:
+                updated += self._save(batch, options['update_units'])
+        bump_version(Ingredient)
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено: {created}, '
+            f'обновлено: {updated} за {elapsed:.2f} с '
+            f'({processed / elapsed if elapsed else processed:.0f} строк/с).'
+        ))
+
+    @transaction.atomic
+    def _save(self, batch, update_units):
+        updated = []
+        if update_units:
+            for ingredient in Ingredient.objects.filter(name__in=batch):
+                measurement_unit = batch.pop(ingredient.name)
+                if ingredient.measurement_unit != measurement_unit:
+                    ingredient.measurement_unit = measurement_unit
+                    updated.append(ingredient)
+            Ingredient.objects.bulk_update(updated, ('measurement_unit',))
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in batch.items()
+            ),
+            ignore_conflicts=True,
+        )
+        return len(updated)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересборка сводных списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, завершиться с ошибкой при расхождениях.',
+        )
+
+    def handle(self, *args, **options):
+        drift = shopping_list.get_drift()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        for (user_id, ingredient_id), (current, expected) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{current} -> {expected}'
+            )
+        if options['check']:
+            raise CommandError(f'Найдено расхождений: {len(drift)}.')
+        shopping_list.repair(drift)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено позиций: {len(drift)}.'))
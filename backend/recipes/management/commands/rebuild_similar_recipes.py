@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipes import similar
+from recipes.models import SimilarRecipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по ингредиентам для всех рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов сравнивается со всеми за один шаг.',
+        )
+
+    def handle(self, *args, **options):
+        similar.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пар похожих рецептов: {SimilarRecipe.objects.count()}.'))
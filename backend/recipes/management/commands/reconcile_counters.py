@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка и пересчёт счётчиков рецептов, подписчиков, избранного, '
+        'покупок и рецептов с каждым ингредиентом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить, завершиться с ошибкой при расхождениях.',
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.get_drift()
+        for counter, count in drift.items():
+            self.stdout.write(f'{counter}: расхождений {count}')
+        total = sum(drift.values())
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        if options['check']:
+            raise CommandError(f'Найдено расхождений: {total}.')
+        counters.reconcile()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
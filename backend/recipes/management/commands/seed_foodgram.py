@@ -0,0 +1,241 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes import counters, feed, search, shopping_list, similar
+from recipes.models import (
+                            Favorite,
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            RecipeTag,
+                            ShoppingCart,
+                            Subscription,
+                            Tag,
+                            User,
+                            )
+from recipes.versions import bump_version
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+class Zipf:
+    """Выбор объектов с убывающей популярностью: вес k-го равен 1 / k^s.
+
+    Так распределены авторы по числу рецептов и рецепты по числу
+    добавлений в избранное и корзину.
+    """
+
+    def __init__(self, items, rng, exponent):
+        self.items = list(items)
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def choice(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, count):
+        """Не более count различных объектов."""
+        count = min(count, len(self.items))
+        chosen = set()
+        for _ in range(count * 4):
+            if len(chosen) >= count:
+                break
+            chosen.add(self.choice())
+        return chosen
+
+
+class Command(BaseCommand):
+    help = 'Заполнение базы синтетическими данными для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Сколько ингредиентов создать, если справочник пуст.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help='Среднее число ингредиентов в рецепте.',
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=10,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Среднее число рецептов в избранном пользователя.',
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Среднее число рецептов в корзине пользователя.',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель степенного распределения популярности.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--password',
+            default='foodgram-seed',
+            help='Пароль всех созданных пользователей.',
+        )
+
+    def _draw(self, mean):
+        """Случайное количество со средним mean и длинным хвостом."""
+        return max(0, round(self.rng.expovariate(1 / mean))) if mean else 0
+
+    def _create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {len(objects)}')
+
+    def _get_ids(self, queryset):
+        return list(queryset.order_by('id').values_list('id', flat=True))
+
+    def _create_users(self, count, password):
+        last_id = User.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        password = make_password(password)
+        self._create(User, [
+            User(
+                username=f'seed{last_id + number}',
+                email=f'seed{last_id + number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(1, count + 1)
+        ])
+        return self._get_ids(User.objects.filter(id__gt=last_id))
+
+    def _create_tags(self, count):
+        existing = Tag.objects.count()
+        if existing < count:
+            self._create(Tag, [
+                Tag(
+                    name=f'Тег {number}',
+                    color=f'#{self.rng.randrange(0x1000000):06X}',
+                    slug=f'seed-tag-{number}',
+                )
+                for number in range(existing + 1, count + 1)
+            ])
+            bump_version(Tag)
+        return self._get_ids(Tag.objects.all())
+
+    def _create_ingredients(self, count):
+        if not Ingredient.objects.exists():
+            self._create(Ingredient, [
+                Ingredient(
+                    name=f'ингредиент {number}',
+                    measurement_unit=self.rng.choice(UNITS),
+                )
+                for number in range(1, count + 1)
+            ])
+            bump_version(Ingredient)
+        return self._get_ids(Ingredient.objects.all())
+
+    def _create_recipes(self, count, authors):
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        self._create(Recipe, [
+            Recipe(
+                name=f'Рецепт {last_id + number}',
+                text=f'Описание рецепта {last_id + number}.',
+                cooking_time=self.rng.randint(5, 180),
+                author_id=authors.choice(),
+            )
+            for number in range(1, count + 1)
+        ])
+        return self._get_ids(Recipe.objects.filter(id__gt=last_id))
+
+    def _fill_recipes(self, recipe_ids, ingredients, tag_ids, mean):
+        recipe_ingredients = []
+        recipe_tags = []
+        for recipe_id in recipe_ids:
+            for ingredient_id in ingredients.sample(max(1, self._draw(mean))):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                ))
+            for tag_id in self.rng.sample(
+                tag_ids, min(len(tag_ids), self.rng.randint(1, 3))
+            ):
+                recipe_tags.append(
+                    RecipeTag(recipe_id=recipe_id, tag_id=tag_id))
+        self._create(RecipeIngredient, recipe_ingredients)
+        self._create(RecipeTag, recipe_tags)
+
+    def _create_user_lists(self, user_ids, authors, recipes, options):
+        subscriptions, favorites, carts = [], [], []
+        for user_id in user_ids:
+            for author_id in authors.sample(
+                self._draw(options['subscriptions'])
+            ):
+                if author_id != user_id:
+                    subscriptions.append(Subscription(
+                        follower_id=user_id, author_id=author_id))
+            for recipe_id in recipes.sample(
+                self._draw(options['favorites'])
+            ):
+                favorites.append(
+                    Favorite(user_id=user_id, recipe_id=recipe_id))
+            for recipe_id in recipes.sample(self._draw(options['cart'])):
+                carts.append(
+                    ShoppingCart(user_id=user_id, recipe_id=recipe_id))
+        self._create(Subscription, subscriptions)
+        self._create(Favorite, favorites)
+        self._create(ShoppingCart, carts)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        skew = options['skew']
+        user_ids = self._create_users(options['users'], options['password'])
+        tag_ids = self._create_tags(options['tags'])
+        ingredient_ids = self._create_ingredients(options['ingredients'])
+        authors = Zipf(
+            self.rng.sample(user_ids, len(user_ids)), self.rng, skew)
+        recipe_ids = self._create_recipes(options['recipes'], authors)
+        self._fill_recipes(
+            recipe_ids,
+            Zipf(ingredient_ids, self.rng, skew),
+            tag_ids,
+            options['ingredients_per_recipe'],
+        )
+        self._create_user_lists(
+            user_ids,
+            authors,
+            Zipf(self.rng.sample(recipe_ids, len(recipe_ids)), self.rng, skew),
+            options,
+        )
+        # bulk_create не вызывает сигналы: производные данные
+        # пересчитываются целиком.
+        counters.reconcile()
+        shopping_list.repair(shopping_list.get_drift())
+        feed.rebuild()
+        search.rebuild()
+        similar.rebuild()
+        self.stdout.write(self.style.SUCCESS('База заполнена.'))
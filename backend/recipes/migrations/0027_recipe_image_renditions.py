@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0026_recipe_tag_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_card',
+            field=models.ImageField(default=None, editable=False, null=True, upload_to='recipe/images/', verbose_name='Фото для карточки рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_detail',
+            field=models.ImageField(default=None, editable=False, null=True, upload_to='recipe/images/', verbose_name='Фото для страницы рецепта'),
+        ),
+    ]
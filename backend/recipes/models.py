@@ -1,10 +1,12 @@
 from django.db import models
 
-from users.models import User
+from users.models import CounterFieldsMixin, User
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Рецепты."""
+    counter_fields = ('favorites_count', 'in_carts_count')
+
     ingredients = models.ManyToManyField(
         'Ingredient',
         through='RecipeIngredient',
@@ -21,6 +23,20 @@ class Recipe(models.Model):
         default=None,
         verbose_name='Фото рецепта',
     )
+    image_card = models.ImageField(
+        upload_to='recipe/images/',
+        null=True,
+        default=None,
+        editable=False,
+        verbose_name='Фото для карточки рецепта',
+    )
+    image_detail = models.ImageField(
+        upload_to='recipe/images/',
+        null=True,
+        default=None,
+        editable=False,
+        verbose_name='Фото для страницы рецепта',
+    )
     name = models.CharField(
         unique=True,
         max_length=200,
@@ -42,11 +58,31 @@ class Recipe(models.Model):
         related_name='recipes',
         verbose_name='Автор рецепта',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
 
 class Tag(models.Model):
@@ -76,8 +112,10 @@ class Tag(models.Model):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(CounterFieldsMixin, models.Model):
     """Таблица ингридиентов."""
+    counter_fields = ('recipes_count',)
+
     name = models.CharField(
         max_length=200,
         unique=True,
@@ -87,6 +125,11 @@ class Ingredient(models.Model):
         max_length=200,
         verbose_name='Единицы измерения',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -143,6 +186,12 @@ class RecipeTag(models.Model):
     class Meta:
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецепта'
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipe_tag_tag_recipe_idx'
+            )
+        ]
 
 
 class Subscription(models.Model):
@@ -171,6 +220,82 @@ class Subscription(models.Model):
         ]
 
 
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+    follower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['follower', '-pub_date', '-recipe'],
+                name='feed_follower_pub_date_idx'
+            ),
+            models.Index(
+                fields=['follower', 'author'],
+                name='feed_follower_author_idx'
+            ),
+        ]
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт, похожий на данный по набору ингредиентов."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+
 class Favorite(models.Model):
     """Избранные рецепты."""
     user = models.ForeignKey(
@@ -216,3 +341,30 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+
+
+class ShoppingListItem(models.Model):
+    """Сводный список покупок, пересчитывается при изменении корзины."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(verbose_name='количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
@@ -0,0 +1,116 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from foodgram.db_routers import PRIMARY
+from recipes.models import Recipe
+
+# Конфигурация полнотекстового поиска PostgreSQL, в ней построен
+# столбец search_vector (миграция 0029_recipe_search).
+SEARCH_CONFIG = 'russian'
+# Таблица FTS5 с названиями и описаниями рецептов для SQLite.
+FTS_TABLE = 'recipes_recipe_search'
+# Вес совпадений в названии относительно совпадений в описании.
+NAME_WEIGHT = 10.0
+
+
+def _fold(column):
+    """Выражение SQL, заменяющее ё на е: FTS5 не убирает её диакритику."""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _get_fts_query(query):
+    """Запрос FTS5: все слова запроса, каждое целиком или как префикс.
+
+    В SQLite нет русского стемминга, префиксный поиск находит хотя бы
+    формы с тем же началом слова, а точное совпадение ранжируется выше.
+    """
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+    return ' AND '.join(f'("{word}" OR "{word}"*)' for word in words)
+
+
+def search(queryset, query):
+    """Рецепты, подходящие под запрос, от более к менее релевантным.
+
+    Добавляет к рецептам аннотацию search_rank. На PostgreSQL поиск
+    идёт по столбцу search_vector с индексом GIN, на SQLite — по
+    таблице FTS5, в остальных базах — по вхождению подстроки без
+    ранжирования.
+    """
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    if connection.vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        params = (SEARCH_CONFIG, query)
+        match = RawSQL(
+            f'{table}.search_vector @@ {tsquery}', params, BooleanField())
+        rank = RawSQL(
+            f'ts_rank_cd({table}.search_vector, {tsquery})',
+            params,
+            FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank).order_by(
+            '-search_rank', '-pub_date', '-id')
+    if connection.vendor == 'sqlite':
+        fts_query = _get_fts_query(query)
+        if not fts_query:
+            return queryset.none()
+        # bm25 тем меньше, чем лучше совпадение, и доступен только в
+        # запросе с MATCH. Ранги всех совпадений считаются один раз:
+        # LIMIT -1 не даёт SQLite подставить подзапрос в коррелированный
+        # и выполнять MATCH заново для каждого рецепта.
+        matches = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        match = RawSQL(
+            f'{table}.id IN ({matches})', (fts_query,), BooleanField())
+        rank = RawSQL(
+            f'(SELECT ranks.rank FROM (SELECT rowid AS id, '
+            f'-bm25({FTS_TABLE}, %s, 1.0) AS rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s LIMIT -1) AS ranks '
+            f'WHERE ranks.id = {table}.id)',
+            (NAME_WEIGHT, fts_query),
+            FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank).order_by(
+            '-search_rank', '-pub_date', '-id')
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query))
+
+
+def index_recipe(recipe, using):
+    """Обновляет рецепт в таблице FTS5, на PostgreSQL не нужно."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe.pk,))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'VALUES (%s, {_fold("%s")}, {_fold("%s")})',
+            (recipe.pk, recipe.name, recipe.text),
+        )
+
+
+def unindex_recipe(recipe_id, using):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe_id,))
+
+
+def rebuild(using=PRIMARY):
+    """Заполняет таблицу FTS5 заново по всем рецептам."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'SELECT id, {_fold("name")}, {_fold("text")} '
+            f'FROM {Recipe._meta.db_table}'
+        )
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe, sign=1):
+    return {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount')
+    }
+
+
+def _lock_items(user_ids, amounts):
+    return {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user__in=user_ids, ingredient__in=amounts)
+    }
+
+
+def apply_amounts(user_ids, amounts):
+    """Прибавляет к спискам покупок пользователей изменения количеств.
+
+    amounts — словарь {id ингредиента: изменение количества}, позиции
+    с нулевым итогом удаляются.
+    """
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    if not user_ids or not amounts:
+        return
+    with transaction.atomic():
+        items = _lock_items(user_ids, amounts)
+        missing = [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, total_amount=0)
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items()
+            if amount > 0 and (user_id, ingredient_id) not in items
+        ]
+        if missing:
+            # Ту же позицию может одновременно создать другой запрос:
+            # недостающие строки вставляются с нулём без ошибки о
+            # конфликте и блокируются вместе с остальными.
+            ShoppingListItem.objects.bulk_create(
+                missing, ignore_conflicts=True)
+            items = _lock_items(user_ids, amounts)
+        changed, emptied = [], []
+        for user_id in user_ids:
+            for ingredient_id, amount in amounts.items():
+                item = items.get((user_id, ingredient_id))
+                if item is None:
+                    continue
+                item.total_amount += amount
+                if item.total_amount > 0:
+                    changed.append(item)
+                else:
+                    emptied.append(item.id)
+        ShoppingListItem.objects.bulk_update(changed, ('total_amount',))
+        if emptied:
+            ShoppingListItem.objects.filter(id__in=emptied).delete()
+
+
+def add_recipe(user_id, recipe):
+    apply_amounts((user_id,), get_recipe_amounts(recipe))
+
+
+def remove_recipe(user_id, recipe):
+    apply_amounts((user_id,), get_recipe_amounts(recipe, sign=-1))
+
+
+def change_recipe(recipe, amounts):
+    """Учитывает изменение ингредиентов рецепта во всех корзинах."""
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=recipe).values_list('user_id', flat=True))
+    apply_amounts(user_ids, amounts)
+
+
+def get_expected_amounts():
+    """Списки покупок, посчитанные заново по корзинам."""
+    return {
+        (row['recipe__shopping_cart_recipes__user'], row['ingredient']):
+            row['total_amount']
+        for row in RecipeIngredient.objects.filter(
+            recipe__shopping_cart_recipes__isnull=False
+        ).values(
+            'recipe__shopping_cart_recipes__user', 'ingredient'
+        ).annotate(total_amount=Sum('amount')).order_by().iterator()
+    }
+
+
+def get_drift():
+    """Расхождения таблицы с корзинами: {(user, ingredient): (было, надо)}."""
+    expected = get_expected_amounts()
+    drift = {}
+    for user_id, ingredient_id, total_amount in (
+        ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount').iterator()
+    ):
+        key = (user_id, ingredient_id)
+        expected_amount = expected.pop(key, None)
+        if expected_amount != total_amount:
+            drift[key] = (total_amount, expected_amount)
+    for key, expected_amount in expected.items():
+        drift[key] = (None, expected_amount)
+    return drift
+
+
+@transaction.atomic
+def repair(drift):
+    created, changed, removed = [], [], []
+    for (user_id, ingredient_id), (current, expected) in drift.items():
+        if expected is None:
+            removed.append((user_id, ingredient_id))
+        elif current is None:
+            created.append(ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=expected,
+            ))
+        else:
+            changed.append((user_id, ingredient_id, expected))
+    for user_id, ingredient_id in removed:
+        ShoppingListItem.objects.filter(
+            user_id=user_id, ingredient_id=ingredient_id).delete()
+    for user_id, ingredient_id, expected in changed:
+        ShoppingListItem.objects.filter(
+            user_id=user_id, ingredient_id=ingredient_id
+        ).update(total_amount=expected)
+    ShoppingListItem.objects.bulk_create(created)
@@ -0,0 +1,164 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+                            Favorite,
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            RecipeTag,
+                            ShoppingCart,
+                            Subscription,
+                            Tag,
+                            User,
+                            )
+from recipes import feed, search, shopping_list, similar
+from recipes import tasks as recipe_tasks
+from recipes.versions import bump_version
+from tasks import queue
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=User)
+def bump_object_version(sender, instance, **kwargs):
+    bump_version(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def bump_token_user_version(instance, **kwargs):
+    bump_version(User, instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def bump_recipe_version(instance, **kwargs):
+    if instance.recipe_id is not None:
+        bump_version(Recipe, instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def decrement_ingredient_frequencies(instance, **kwargs):
+    similar.change_frequencies(
+        RecipeIngredient.objects.filter(
+            recipe=instance).values('ingredient_id'),
+        -1,
+    )
+
+
+# Рецепты, которые удаляются в текущем контексте: их корзины уже
+# вычтены из списков покупок, каскадное удаление корзин их не трогает.
+_deleting_recipes = ContextVar('deleting_recipes', default=frozenset())
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(instance, **kwargs):
+    # Ингредиенты рецепта удаляются каскадно раньше корзин, поэтому
+    # рецепт вычитается из всех списков сразу, пока они на месте.
+    shopping_list.change_recipe(
+        instance, shopping_list.get_recipe_amounts(instance, sign=-1))
+    _deleting_recipes.set(_deleting_recipes.get() | {instance.pk})
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe(instance, **kwargs):
+    _deleting_recipes.set(_deleting_recipes.get() - {instance.pk})
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, **kwargs):
+    if instance.recipe_id not in _deleting_recipes.get():
+        shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1)
+
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        counter = RECIPE_COUNTERS[sender]
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            **{counter: F(counter) + 1})
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    counter = RECIPE_COUNTERS[sender]
+    Recipe.objects.filter(
+        pk=instance.recipe_id, **{f'{counter}__gt': 0}
+    ).update(**{counter: F(counter) - 1})
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(instance, using, update_fields, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        search.index_recipe(instance, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(instance, using, **kwargs):
+    search.unindex_recipe(instance.pk, using)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(instance, created, **kwargs):
+    if created:
+        feed.add_recipe(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def add_subscription(instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1)
+        feed.add_author(instance.follower_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_subscription(instance, **kwargs):
+    updated = User.objects.filter(
+        pk=instance.author_id, followers_count__gt=0
+    ).update(followers_count=F('followers_count') - 1)
+    feed.remove_author(instance.follower_id, instance.author_id)
+    if updated and User.objects.filter(
+        pk=instance.author_id,
+        followers_count=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+    ).exists():
+        # Автор перестал быть популярным: его рецепты снова
+        # рассылаются по лентам, прежние переносятся в фоне.
+        queue.enqueue(recipe_tasks.fill_feeds, instance.author_id)
@@ -0,0 +1,191 @@
+import heapq
+import math
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min
+from scipy import sparse
+
+from recipes.models import (
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            SimilarRecipe,
+                            )
+
+
+def get_idf(recipes_count, frequency):
+    """Сглаженная обратная частота ингредиента среди рецептов.
+
+    Рецепт — вектор по ингредиентам с весами idf: количество в
+    рецепте не учитывается, граммы и штуки между собой не сравнимы.
+    """
+    return np.log((1 + recipes_count) / (1 + frequency)) + 1
+
+
+def _get_matrix():
+    """Id рецептов и нормированная матрица рецепты × ингредиенты."""
+    pairs = np.array(
+        RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids)),
+    )
+    idf = get_idf(Recipe.objects.count(), matrix.getnnz(axis=0))
+    matrix = matrix.multiply(idf).tocsr()
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    return recipe_ids, (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def _get_neighbours(matrix, count, batch_size):
+    """Номера строк и сходство ближайших соседей каждой строки.
+
+    Косинусы считаются произведением блока строк на всю матрицу, так
+    что в памяти одновременно только batch_size строк результата.
+    """
+    transposed = matrix.T.tocsr()
+    for start in range(0, matrix.shape[0], batch_size):
+        scores = (matrix[start:start + batch_size] @ transposed).tocsr()
+        for offset in range(scores.shape[0]):
+            begin, end = scores.indptr[offset:offset + 2]
+            columns = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            other = columns != start + offset
+            columns, values = columns[other], values[other]
+            if len(values) > count:
+                top = np.argpartition(-values, count)[:count]
+                columns, values = columns[top], values[top]
+            yield start + offset, columns, values
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Пересчитывает похожие рецепты для всех рецептов."""
+    SimilarRecipe.objects.all().delete()
+    if not RecipeIngredient.objects.exists():
+        return
+    recipe_ids, matrix = _get_matrix()
+    rows = []
+    for row, columns, values in _get_neighbours(
+        matrix, settings.SIMILAR_RECIPES_COUNT, batch_size
+    ):
+        rows.extend(
+            SimilarRecipe(
+                recipe_id=int(recipe_ids[row]),
+                similar_id=int(recipe_ids[column]),
+                score=float(value),
+            )
+            for column, value in zip(columns, values)
+        )
+        if len(rows) >= batch_size:
+            SimilarRecipe.objects.bulk_create(rows)
+            rows = []
+    SimilarRecipe.objects.bulk_create(rows)
+
+
+def change_frequencies(ingredient_ids, delta):
+    """Меняет число рецептов с ингредиентами, по нему считается idf.
+
+    Строки RecipeIngredient создаются через bulk_create без сигналов,
+    поэтому счётчик меняют код, который их создаёт и удаляет, и
+    reconcile_counters.
+    """
+    ingredients = Ingredient.objects.filter(id__in=ingredient_ids)
+    if delta < 0:
+        ingredients = ingredients.filter(recipes_count__gte=-delta)
+    ingredients.update(recipes_count=F('recipes_count') + delta)
+
+
+def _update_neighbours(recipe_id, ingredients, scores):
+    """Обновляет рецепт в списках похожих других рецептов.
+
+    Рецепт попадает в чужой список, если список не заполнен или рецепт
+    похож сильнее, чем последний в нём, и уходит из списков рецептов,
+    с которыми у него не осталось общих ингредиентов.
+    """
+    changed, removed, added, replaced = [], [], [], []
+    current = set()
+    for similar in SimilarRecipe.objects.filter(similar=recipe_id):
+        current.add(similar.recipe_id)
+        if similar.recipe_id in scores:
+            similar.score = scores[similar.recipe_id]
+            changed.append(similar)
+        else:
+            removed.append(similar.pk)
+    lists = {
+        row['recipe_id']: (row['size'], row['weakest'])
+        for row in SimilarRecipe.objects.filter(
+            recipe__in=RecipeIngredient.objects.filter(
+                ingredient__in=ingredients).values('recipe_id'),
+        ).values('recipe_id').annotate(size=Count('id'), weakest=Min('score'))
+    }
+    for other_id, score in scores.items():
+        if other_id in current:
+            continue
+        size, weakest = lists.get(other_id, (0, None))
+        if size >= settings.SIMILAR_RECIPES_COUNT:
+            if score <= weakest:
+                continue
+            replaced.append(other_id)
+        added.append(SimilarRecipe(
+            recipe_id=other_id, similar_id=recipe_id, score=score))
+    weakest = {}
+    for pk, other_id, score in SimilarRecipe.objects.filter(
+        recipe__in=replaced
+    ).values_list('pk', 'recipe_id', 'score'):
+        if other_id not in weakest or score < weakest[other_id][1]:
+            weakest[other_id] = (pk, score)
+    removed.extend(pk for pk, _ in weakest.values())
+    SimilarRecipe.objects.filter(pk__in=removed).delete()
+    SimilarRecipe.objects.bulk_update(changed, ('score',), batch_size=1000)
+    SimilarRecipe.objects.bulk_create(added, batch_size=1000)
+
+
+@transaction.atomic
+def update_recipe(recipe_id):
+    """Пересчитывает похожие рецепты одного рецепта и его соседей.
+
+    Веса ингредиентов берутся из Ingredient.recipes_count, поэтому
+    таблица RecipeIngredient не группируется целиком при каждом
+    изменении рецепта.
+    """
+    ingredients = set(RecipeIngredient.objects.filter(
+        recipe=recipe_id).values_list('ingredient_id', flat=True))
+    others = defaultdict(set)
+    for other_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe__in=RecipeIngredient.objects.filter(
+            ingredient__in=ingredients).values('recipe_id'),
+    ).exclude(recipe=recipe_id).values_list('recipe_id', 'ingredient_id'):
+        others[other_id].add(ingredient_id)
+    recipes_count = Recipe.objects.count()
+    weights = {
+        ingredient_id: get_idf(recipes_count, frequency) ** 2
+        for ingredient_id, frequency in Ingredient.objects.filter(
+            id__in=ingredients.union(*others.values()),
+        ).values_list('id', 'recipes_count')
+    }
+    norm = math.sqrt(sum(weights[ingredient] for ingredient in ingredients))
+    scores = {
+        other_id: float(
+            sum(weights[ingredient] for ingredient in ingredients & other)
+            / norm
+            / math.sqrt(sum(weights[ingredient] for ingredient in other))
+        )
+        for other_id, other in others.items()
+    }
+    SimilarRecipe.objects.filter(recipe=recipe_id).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other_id, score=score)
+        for other_id, score in heapq.nlargest(
+            settings.SIMILAR_RECIPES_COUNT,
+            scores.items(),
+            key=lambda item: item[1],
+        )
+    )
+    _update_neighbours(recipe_id, ingredients, scores)
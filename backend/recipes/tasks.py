@@ -0,0 +1,26 @@
+from recipes import feed, images, similar
+from recipes.models import Recipe, User
+
+
+def make_renditions(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is not None:
+        images.make_renditions(recipe)
+
+
+def fill_feeds(author_id):
+    feed.add_author_to_followers(author_id)
+
+
+def delete_user(user_id):
+    """Удаляет пользователя вместе с рецептами.
+
+    Рецепты вычитаются из списков покупок обработчиками сигналов.
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is not None:
+        user.delete()
+
+
+def update_similar_recipes(recipe_id):
+    similar.update_recipe(recipe_id)
@@ -0,0 +1,59 @@
+from django.contrib import admin
+from django.test import RequestFactory, TestCase
+
+from api.tests.utils import create_recipe, create_user
+from recipes.admin import RecipeAdmin
+from recipes.models import Favorite, Recipe, User
+
+
+class CounterFieldsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+
+    def test_full_save_keeps_user_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        create_recipe(self.author, 'Рецепт')
+        author.first_name = 'Автор'
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.first_name, 'Автор')
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_full_save_keeps_recipe_counters(self):
+        recipe = create_recipe(self.author, 'Рецепт')
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_admin_author_change_moves_recipe_count(self):
+        recipe = create_recipe(self.author, 'Рецепт')
+        superuser = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        request = RequestFactory().post('/')
+        request.user = superuser
+        model_admin = RecipeAdmin(Recipe, admin.site)
+        # Форма строки списка рецептов с list_editable.
+        form = model_admin.get_changelist_form(
+            request, fields=model_admin.list_editable)(
+            {
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'author': self.reader.pk,
+            },
+            instance=recipe,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, True)
+        self.assertEqual(
+            dict(User.objects.filter(
+                pk__in=(self.author.pk, self.reader.pk)
+            ).values_list('username', 'recipes_count')),
+            {'author': 0, 'reader': 1},
+        )
@@ -0,0 +1,43 @@
+from django.test import TestCase, override_settings
+
+from api.tests.utils import create_recipe, create_user
+from recipes import feed
+from recipes.models import FeedEntry, Subscription
+
+
+@override_settings(
+    FEED_FAN_OUT_MAX_FOLLOWERS=1, FEED_BACKFILL_SIZE=2, TASKS_EAGER=True)
+class FeedBackfillTest(TestCase):
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.readers = [create_user(f'reader{number}') for number in (1, 2)]
+
+    def subscribe(self, reader):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Subscription.objects.create(
+                follower=reader, author=self.author)
+
+    def test_popular_period_stays_in_feed(self):
+        for reader in self.readers:
+            self.subscribe(reader)
+        recipes = [
+            create_recipe(self.author, f'Рецепт {number}')
+            for number in range(5)
+        ]
+        self.assertFalse(FeedEntry.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.get(follower=self.readers[1]).delete()
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                follower=self.readers[0]).values_list('recipe', flat=True)),
+            {recipe.id for recipe in recipes},
+        )
+
+    def test_subscription_and_rebuild_are_capped(self):
+        for number in range(5):
+            create_recipe(self.author, f'Рецепт {number}')
+        self.subscribe(self.readers[0])
+        self.assertEqual(FeedEntry.objects.count(), 2)
+        feed.rebuild()
+        self.assertEqual(FeedEntry.objects.count(), 2)
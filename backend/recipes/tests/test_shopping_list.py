@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.tests.utils import create_ingredients, create_recipe, create_user
+from recipes import shopping_list
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+class ApplyAmountsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.flour, cls.sugar = create_ingredients(2)
+
+    def _get_totals(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient_id', 'total_amount'))
+
+    def test_amounts_are_added_and_emptied_items_removed(self):
+        shopping_list.apply_amounts(
+            (self.user.id,), {self.flour.id: 100, self.sugar.id: 50})
+        shopping_list.apply_amounts(
+            (self.user.id,), {self.flour.id: 20, self.sugar.id: -50})
+        self.assertEqual(self._get_totals(), {self.flour.id: 120})
+
+    def test_item_created_concurrently_is_not_lost(self):
+        ShoppingListItem.objects.create(
+            user=self.user, ingredient=self.flour, total_amount=30)
+        lock_items = shopping_list._lock_items
+        # Первая блокировка не видит позицию, которую вставил
+        # параллельный запрос.
+        with mock.patch.object(
+            shopping_list,
+            '_lock_items',
+            side_effect=[{}, lock_items((self.user.id,), {self.flour.id})],
+        ):
+            shopping_list.apply_amounts((self.user.id,), {self.flour.id: 70})
+        self.assertEqual(self._get_totals(), {self.flour.id: 100})
+
+
+class ShoppingListSignalsTest(TestCase):
+    """Список покупок следует за корзинами при любом способе удаления."""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.buyers = [create_user('buyer'), create_user('other')]
+        self.flour, self.sugar = create_ingredients(2)
+        self.pie = create_recipe(
+            self.author, 'Пирог', (), (self.flour, self.sugar))
+        self.bread = create_recipe(self.author, 'Хлеб', (), (self.flour,))
+        for buyer in self.buyers:
+            for recipe in (self.pie, self.bread):
+                ShoppingCart.objects.create(user=buyer, recipe=recipe)
+
+    def _get_totals(self, user):
+        return dict(ShoppingListItem.objects.filter(
+            user=user).values_list('ingredient_id', 'total_amount'))
+
+    def test_carts_are_added(self):
+        self.assertEqual(
+            self._get_totals(self.buyers[0]),
+            {self.flour.id: 20, self.sugar.id: 10},
+        )
+        self.assertEqual(shopping_list.get_drift(), {})
+
+    def test_deleted_cart_is_removed(self):
+        ShoppingCart.objects.filter(
+            user=self.buyers[0], recipe=self.pie).delete()
+        self.assertEqual(
+            self._get_totals(self.buyers[0]), {self.flour.id: 10})
+        self.assertEqual(shopping_list.get_drift(), {})
+
+    def test_deleted_recipe_is_removed(self):
+        self.pie.delete()
+        for buyer in self.buyers:
+            self.assertEqual(self._get_totals(buyer), {self.flour.id: 10})
+        self.assertEqual(shopping_list.get_drift(), {})
+        ShoppingCart.objects.filter(recipe=self.bread).delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_deleted_author_is_removed(self):
+        self.author.delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_deleted_buyer_is_removed(self):
+        self.buyers[0].delete()
+        self.assertEqual(
+            self._get_totals(self.buyers[1]),
+            {self.flour.id: 20, self.sugar.id: 10},
+        )
+        self.assertEqual(shopping_list.get_drift(), {})
@@ -0,0 +1,170 @@
+import math
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.tests.utils import (
+                             create_ingredients,
+                             create_recipe,
+                             create_tags,
+                             create_user,
+                             )
+from recipes import counters, similar, tasks
+from recipes.models import Ingredient, SimilarRecipe
+
+
+def get_lists():
+    """Списки похожих рецептов: {рецепт: {похожий: сходство}}."""
+    lists = {}
+    for row in SimilarRecipe.objects.all():
+        lists.setdefault(row.recipe_id, {})[row.similar_id] = row.score
+    return lists
+
+
+class SimilarScoresTest(TestCase):
+    """Сходство рецептов при полном и частичном пересчёте."""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.ingredients = create_ingredients(5)
+
+    def create(self, name, *numbers):
+        recipe = create_recipe(
+            self.author,
+            name,
+            ingredients=[self.ingredients[number] for number in numbers],
+        )
+        # Помощник создаёт ингредиенты рецепта через bulk_create.
+        counters.reconcile()
+        return recipe
+
+    def assertSameScores(self, actual, expected):
+        self.assertEqual(actual.keys(), expected.keys())
+        for recipe_id, scores in expected.items():
+            self.assertEqual(actual[recipe_id].keys(), scores.keys())
+            for similar_id, score in scores.items():
+                self.assertAlmostEqual(actual[recipe_id][similar_id], score)
+
+    def test_score_is_idf_weighted_cosine(self):
+        first = self.create('Первый', 0, 1)
+        second = self.create('Второй', 0)
+        similar.rebuild()
+        common = similar.get_idf(2, 2) ** 2
+        rare = similar.get_idf(2, 1) ** 2
+        self.assertAlmostEqual(
+            get_lists()[first.id][second.id],
+            common / math.sqrt(common + rare) / math.sqrt(common),
+        )
+
+    def test_update_matches_rebuild(self):
+        recipes = [
+            self.create('Первый', 0, 1, 2),
+            self.create('Второй', 0, 3),
+            self.create('Третий', 1, 2, 4),
+            self.create('Четвёртый', 3, 4),
+        ]
+        similar.rebuild()
+        expected = get_lists()
+        for recipe in recipes:
+            similar.update_recipe(recipe.id)
+        self.assertSameScores(get_lists(), expected)
+
+    def test_neighbours_are_ordered_by_score(self):
+        target = self.create('Целевой', 0, 1, 2)
+        superset = self.create('Все и редкий', 0, 1, 2, 3)
+        two = self.create('Два общих', 0, 1)
+        one = self.create('Один общий', 2)
+        self.create('Без общих', 4)
+        # Шаг меньше числа рецептов: матрица умножается по блокам.
+        call_command(
+            'rebuild_similar_recipes', batch_size=2, stdout=StringIO())
+        client = APIClient()
+        response = client.get(f'/api/recipes/{target.id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        # Редкий ингредиент удлиняет вектор рецепта сильнее, чем общие:
+        # рецепт со всеми ингредиентами и редким похож меньше, чем рецепт
+        # с двумя общими.
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data],
+            [two.id, superset.id, one.id],
+        )
+
+    def test_task_matches_batch_command(self):
+        recipes = [
+            self.create('Первый', 0, 1, 2),
+            self.create('Второй', 0, 3),
+            self.create('Третий', 1, 2, 4),
+            self.create('Четвёртый', 3, 4),
+        ]
+        call_command(
+            'rebuild_similar_recipes', batch_size=2, stdout=StringIO())
+        expected = get_lists()
+        SimilarRecipe.objects.all().delete()
+        for recipe in recipes:
+            tasks.update_similar_recipes(recipe.id)
+        self.assertSameScores(get_lists(), expected)
+
+    @override_settings(SIMILAR_RECIPES_COUNT=1)
+    def test_new_recipe_enters_neighbour_lists(self):
+        first = self.create('Первый', 0, 1, 2)
+        second = self.create('Второй', 0)
+        third = self.create('Третий', 3)
+        similar.rebuild()
+        new = self.create('Новый', 0, 1)
+        similar.update_recipe(new.id)
+        lists = get_lists()
+        self.assertEqual(lists[first.id].keys(), {new.id})
+        self.assertEqual(lists[second.id].keys(), {new.id})
+        self.assertNotIn(third.id, lists)
+        self.assertEqual(lists[new.id].keys(), {first.id})
+
+    def test_recipe_leaves_lists_without_common_ingredients(self):
+        self.create('Первый', 0, 1)
+        second = self.create('Второй', 1)
+        similar.rebuild()
+        second.recipe_ingredients.update(ingredient=self.ingredients[4])
+        counters.reconcile()
+        similar.update_recipe(second.id)
+        self.assertEqual(get_lists(), {})
+
+
+@override_settings(TASKS_EAGER=True)
+class IngredientFrequencyTest(TestCase):
+    """Число рецептов с ингредиентом меняется при правке рецептов."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('author'))
+        self.tags = create_tags(1)
+        self.ingredients = create_ingredients(3)
+
+    def get_counts(self):
+        return list(Ingredient.objects.order_by('id').values_list(
+            'recipes_count', flat=True))
+
+    def send(self, method, url, numbers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[number].id, 'amount': 10}
+                    for number in numbers
+                ],
+            }, format='json')
+
+    def test_counts_follow_recipe_changes(self):
+        response = self.send('post', '/api/recipes/', (0, 1))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_counts(), [1, 1, 0])
+        url = f'/api/recipes/{response.data["id"]}/'
+        self.send('patch', url, (1, 2))
+        self.assertEqual(self.get_counts(), [0, 1, 1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+        self.assertEqual(self.get_counts(), [0, 0, 0])
+        self.assertFalse(any(counters.get_drift().values()))
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from recipes.models import Tag
+from recipes.versions import bump_version, get_version
+
+
+class VersionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_is_stable_until_bumped(self):
+        self.assertEqual(get_version(Tag), get_version(Tag))
+
+    def test_each_bump_gives_a_new_version(self):
+        versions = [get_version(Tag)]
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_version(Tag)
+            versions.append(get_version(Tag))
+        self.assertEqual(len(set(versions)), len(versions))
+
+    def test_bump_after_cache_clear_gives_a_new_version(self):
+        version = get_version(Tag, 1)
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(Tag, 1)
+        self.assertNotEqual(get_version(Tag, 1), version)
@@ -0,0 +1,51 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _get_key(model, pk=None):
+    key = f'version:{model._meta.label_lower}'
+    if pk is not None:
+        key = f'{key}:{pk}'
+    return key
+
+
+def _new_version():
+    """Случайная версия: после очистки кеша не повторяет выданные ранее."""
+    return uuid4().hex
+
+
+def get_version(model, pk=None):
+    """Текущая версия данных модели или отдельного объекта."""
+    key = _get_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_versions(model, pks):
+    """Версии нескольких объектов модели: {pk: версия}."""
+    keys = {_get_key(model, pk): pk for pk in pks}
+    versions = {
+        keys[key]: version for key, version in cache.get_many(keys).items()
+    }
+    for key, pk in keys.items():
+        if pk not in versions:
+            versions[pk] = get_version(model, pk)
+    return versions
+
+
+def bump_version(model, pk=None):
+    """Заменяет версию новой после фиксации транзакции.
+
+    Версия не увеличивается через cache.incr: в файловом и локальном
+    кеше это чтение и запись, и одновременные изменения могли дать одну
+    и ту же версию.
+    """
+    key = _get_key(model, pk)
+    transaction.on_commit(
+        lambda: cache.set(key, _new_version(), timeout=None))
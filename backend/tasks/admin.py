@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from tasks.models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'run_after', 'user', 'created')
+    list_filter = ('status', 'name')
+    readonly_fields = ('result', 'error', 'locked_until')
@@ -0,0 +1,60 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import queue
+
+
+class Command(BaseCommand):
+    help = 'Запуск воркера фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.TASKS_CONCURRENCY,
+            help='Количество одновременно выполняемых задач.',
+        )
+        parser.add_argument(
+            '--pool',
+            choices=('thread', 'process'),
+            default='thread',
+            help='Выполнять задачи в потоках или в процессах.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить доступные задачи и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            executor = ProcessPoolExecutor(
+                concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(concurrency)
+        self.stdout.write(
+            f'Воркер запущен: {options["pool"]} x {concurrency}.')
+        running = set()
+        try:
+            while True:
+                running = {future for future in running if not future.done()}
+                claimed = queue.claim(concurrency - len(running))
+                for task_id, lease in claimed:
+                    running.add(executor.submit(queue.run, task_id, lease))
+                if options['once'] and not claimed and not running:
+                    break
+                if not claimed:
+                    time.sleep(settings.TASKS_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка воркера.')
+        finally:
+            executor.shutdown(wait=True)
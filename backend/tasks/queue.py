@@ -0,0 +1,131 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from tasks.models import Task
+
+
+def enqueue(func, *args, user=None, **kwargs):
+    """Ставит вызов func(*args, **kwargs) в очередь.
+
+    Задача создаётся в текущей транзакции и становится видна воркеру
+    только после её фиксации. Аргументы должны сериализоваться в JSON.
+    При TASKS_EAGER задача выполняется в текущем процессе сразу после
+    фиксации транзакции.
+    """
+    task = Task.objects.create(
+        name=f'{func.__module__}.{func.__qualname__}',
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=settings.TASKS_MAX_ATTEMPTS,
+        user=user,
+    )
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: _run_eager(task))
+    return task
+
+
+def _run_eager(task):
+    lease = _get_lease()
+    while Task.objects.filter(id=task.id, status=Task.PENDING).update(
+        status=Task.RUNNING, locked_until=lease, attempts=F('attempts') + 1
+    ):
+        run(task.id, lease, close_connections=False)
+        lease = _get_lease()
+    task.refresh_from_db()
+
+
+def _get_lease():
+    return timezone.now() + timedelta(
+        seconds=settings.TASKS_VISIBILITY_TIMEOUT)
+
+
+def _get_available():
+    now = timezone.now()
+    return Task.objects.filter(
+        Q(status=Task.PENDING, run_after__lte=now)
+        | Q(
+            status=Task.RUNNING,
+            locked_until__lt=now,
+            attempts__lt=F('max_attempts'),
+        )
+    )
+
+
+def fail_expired():
+    """Отмечает ошибкой задачи, чья аренда истекла на последней попытке.
+
+    Так задача, которая роняет воркер, не перезапускается бесконечно.
+    """
+    return Task.objects.filter(
+        status=Task.RUNNING,
+        locked_until__lt=timezone.now(),
+        attempts__gte=F('max_attempts'),
+    ).update(
+        status=Task.FAILED,
+        locked_until=None,
+        error='Задача не завершилась за TASKS_VISIBILITY_TIMEOUT секунд.',
+        updated=timezone.now(),
+    )
+
+
+def claim(limit):
+    """Захватывает до limit задач для выполнения.
+
+    Задача остаётся за воркером на TASKS_VISIBILITY_TIMEOUT секунд,
+    после этого её может забрать другой воркер. Возвращает пары
+    (id задачи, срок аренды), срок передаётся в run.
+    """
+    fail_expired()
+    claimed = []
+    candidates = _get_available().order_by('run_after').values_list(
+        'id', flat=True)[:limit]
+    for task_id in candidates:
+        lease = _get_lease()
+        if _get_available().filter(id=task_id).update(
+            status=Task.RUNNING,
+            locked_until=lease,
+            attempts=F('attempts') + 1,
+        ):
+            claimed.append((task_id, lease))
+    return claimed
+
+
+def run(task_id, lease, close_connections=True):
+    """Выполняет захваченную задачу, при ошибке планирует повтор.
+
+    Результат сохраняется, только если задача всё ещё за этим
+    воркером: аренда с тем же сроком не истекла и не перешла к
+    другому воркеру.
+    """
+    if close_connections:
+        close_old_connections()
+    try:
+        task = Task.objects.get(id=task_id)
+        if task.status != Task.RUNNING or task.locked_until != lease:
+            return
+        update = {'locked_until': None, 'updated': timezone.now()}
+        try:
+            result = import_string(task.name)(*task.args, **task.kwargs)
+        except Exception:
+            update['error'] = traceback.format_exc()
+            if task.attempts >= task.max_attempts:
+                update['status'] = Task.FAILED
+            else:
+                update['status'] = Task.PENDING
+                update['run_after'] = timezone.now() + timedelta(
+                    seconds=settings.TASKS_RETRY_DELAY
+                    * 2 ** (task.attempts - 1))
+        else:
+            update.update(status=Task.DONE, result=result, error='')
+        Task.objects.filter(
+            id=task.id, status=Task.RUNNING, locked_until=lease,
+        ).update(**update)
+    finally:
+        if close_connections:
+            close_old_connections()
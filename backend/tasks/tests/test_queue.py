@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks import queue
+from tasks.models import Task
+
+
+def succeed(value):
+    return value
+
+
+def crash():
+    raise RuntimeError('Ошибка задачи')
+
+
+def lose_lease(task_id):
+    """Задача, которую за время выполнения забрал другой воркер."""
+    Task.objects.filter(id=task_id).update(
+        locked_until=timezone.now() - timedelta(seconds=1))
+    queue.claim(1)
+    return 'устаревший результат'
+
+
+@override_settings(TASKS_EAGER=False, TASKS_MAX_ATTEMPTS=2)
+class QueueTest(TestCase):
+    """Аренда задач воркерами и предел числа попыток."""
+
+    def expire(self, task_id):
+        Task.objects.filter(id=task_id).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_task_is_done(self):
+        task = queue.enqueue(succeed, 'готово')
+        ((task_id, lease),) = queue.claim(10)
+        queue.run(task_id, lease, close_connections=False)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.result), (Task.DONE, 'готово'))
+        self.assertIsNone(task.locked_until)
+
+    def test_failed_task_is_retried_until_last_attempt(self):
+        task = queue.enqueue(crash)
+        ((task_id, lease),) = queue.claim(10)
+        queue.run(task_id, lease, close_connections=False)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.PENDING)
+        Task.objects.filter(id=task_id).update(run_after=timezone.now())
+        ((task_id, lease),) = queue.claim(10)
+        queue.run(task_id, lease, close_connections=False)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn('Ошибка задачи', task.error)
+
+    def test_expired_task_is_claimed_again(self):
+        task = queue.enqueue(succeed, 1)
+        ((task_id, _),) = queue.claim(10)
+        self.expire(task_id)
+        self.assertEqual([task_id for task_id, _ in queue.claim(10)], [
+            task.id])
+        task.refresh_from_db()
+        self.assertEqual(task.attempts, 2)
+
+    def test_expired_last_attempt_fails(self):
+        task = queue.enqueue(succeed, 1)
+        for _ in range(2):
+            ((task_id, _),) = queue.claim(10)
+            self.expire(task_id)
+        self.assertEqual(queue.claim(10), [])
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIsNone(task.locked_until)
+
+    def test_worker_without_lease_does_not_save_result(self):
+        task = queue.enqueue(succeed, 'первый')
+        ((task_id, old_lease),) = queue.claim(10)
+        self.expire(task_id)
+        ((task_id, new_lease),) = queue.claim(10)
+        queue.run(task_id, old_lease, close_connections=False)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.RUNNING)
+        self.assertEqual(task.locked_until, new_lease)
+        queue.run(task_id, new_lease, close_connections=False)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.DONE)
+
+    def test_result_is_not_saved_after_lease_is_lost(self):
+        task = queue.enqueue(lose_lease, None)
+        Task.objects.filter(id=task.id).update(args=[task.id])
+        ((task_id, lease),) = queue.claim(10)
+        queue.run(task_id, lease, close_connections=False)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.RUNNING, 2))
+        self.assertIsNone(task.result)
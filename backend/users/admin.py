@@ -6,8 +6,11 @@ from users.models import User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'username', 'password', 'email', 'first_name', 'last_name')
+        'id', 'username', 'password', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count',
+    )
     list_filter = ('username', 'email')
     list_editable = (
         'username', 'password', 'email', 'first_name', 'last_name',
     )
+    readonly_fields = ('recipes_count', 'followers_count')
@@ -1,7 +1,40 @@
 from django.contrib.auth.models import AbstractUser
+from django.db import models
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Не даёт полному save() перезаписать счётчики.
+
+    Счётчики меняются запросами UPDATE с F() и командой
+    reconcile_counters, а значения в объекте могли устареть с момента
+    чтения. Поэтому сохранение существующего объекта без update_fields
+    пишет все поля, кроме counter_fields.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
+    counter_fields = ('recipes_count', 'followers_count')
+
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
 
     class Meta:
         verbose_name = 'Пользователь'